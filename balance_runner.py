@@ -0,0 +1,181 @@
+import argparse
+import copy
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy'); os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# SDL 默认接管 SIGTERM，工作进程会收不到进程池的终止信号
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+from gemini_survivor import (Game, ConfigError, compile_config, CMD_CHOICE, EVOLVED_WEAPONS, TICK_RATE, WORLD_SIZE,
+                             MOVE_LEFT, MOVE_RIGHT, MOVE_UP, MOVE_DOWN)
+
+# --- 参数空间 ---
+# spec 文件示例：
+#   {"grid": {"enemy_stats.enemy.speed": [2, 2.5, 3], "weapon_data.axe_weapon.damage": [4, 5]}}
+#   {"sample": {"enemy_stats.tank.health": [3, 8]}, "samples": 20}
+# 键是 config.json 里用点分隔的路径；grid 取笛卡尔积，sample 在 [低, 高] 内均匀采样（两端都是整数时取整数）
+def set_path(config, path, value):
+    *parents, leaf = path.split('.'); node = config
+    for key in parents:
+        if key not in node: raise ConfigError(f"{path}: 配置里没有 {key}")
+        node = node[key]
+    if leaf not in node: raise ConfigError(f"{path}: 配置里没有 {leaf}")
+    node[leaf] = value
+
+def expand_spec(spec, rng):
+    variants = []
+    grid = spec.get('grid', {})
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)): variants.append(dict(zip(keys, values)))
+    sample = spec.get('sample', {})
+    for _ in range(spec.get('samples', 0) if sample else 0):
+        variants.append({key: rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+                         for key, (low, high) in sample.items()})
+    return variants or [{}]
+
+def build_config(base, overrides):
+    config = copy.deepcopy(base)
+    for path, value in overrides.items(): set_path(config, path, value)
+    compile_config(config)  # 在主进程里先校验，坏的变体不会发到进程池
+    return config
+
+# --- 机器人策略 ---
+class Bot:
+    # 移动：躲开附近敌人的合力，同时被地图边缘往回推；附近没威胁时去捡最近的宝石
+    # 升级：优先拿新武器和武器升级，血量低时优先回血，同分随机
+    THREAT_RADIUS = 400; EDGE_MARGIN = 300
+    CHOICE_WEIGHTS = {'new_weapon': 3, 'weapon_upgrade': 2, 'passive': 1, 'heal': 0}
+
+    def __init__(self, seed): self.rng = random.Random(seed)
+
+    def movement(self, game):
+        px, py = game.player.rect.center; vx = vy = 0.0
+        for enemy in game.enemy_grid.nearest((px, py), 12):
+            ex, ey = enemy.rect.center; d2 = (px - ex) ** 2 + (py - ey) ** 2
+            if d2 > self.THREAT_RADIUS ** 2: break
+            weight = 1 / max(d2, 1); vx += (px - ex) * weight; vy += (py - ey) * weight
+        if vx == vy == 0.0:
+            gems = game.gem_grid.nearest((px, py), 1)
+            if gems: gx, gy = gems[0].rect.center; vx, vy = (gx - px) * 1e-6, (gy - py) * 1e-6
+        threat = math.hypot(vx, vy) or 1e-6
+        for coord, size, axis in ((px, WORLD_SIZE[0], 0), (py, WORLD_SIZE[1], 1)):
+            push = max(0, self.EDGE_MARGIN - coord) - max(0, coord - (size - self.EDGE_MARGIN))
+            if axis == 0: vx += push / self.EDGE_MARGIN * threat
+            else: vy += push / self.EDGE_MARGIN * threat
+        norm = math.hypot(vx, vy); mask = 0
+        if norm == 0: return mask
+        if vx > 0.38 * norm: mask |= MOVE_RIGHT
+        elif vx < -0.38 * norm: mask |= MOVE_LEFT
+        if vy > 0.38 * norm: mask |= MOVE_DOWN
+        elif vy < -0.38 * norm: mask |= MOVE_UP
+        return mask
+
+    def choose(self, game):
+        low_health = game.player.health < game.player.max_health * 0.4
+        def score(choice):
+            if choice['type'] == 'heal' and low_health: return 10
+            return self.CHOICE_WEIGHTS.get(choice['type'], 0) + self.rng.random()
+        scores = [score(choice) for choice in game.level_up_choices]
+        return scores.index(max(scores))
+
+# --- 单局模拟 ---
+def run_one(task):
+    variant, seed, config, minutes = task
+    started = time.perf_counter()
+    game = Game(headless=True, seed=seed, config=config); bot = Bot(seed); game.autopilot = bot.movement
+    limit = int(minutes * 60 * TICK_RATE); checkpoint = 60 * TICK_RATE; levels = []; evolved_at = None
+    while game.sim_clock.ticks < limit and not game.game_over:
+        if game.level_up_state: game.issue_command(CMD_CHOICE, bot.choose(game))
+        game.step()
+        ticks = game.sim_clock.ticks
+        if ticks % checkpoint == 0: levels.append(game.player.level)
+        if evolved_at is None and any(name in EVOLVED_WEAPONS for name in game.weapon_instances): evolved_at = ticks / TICK_RATE
+    survival = game.sim_clock.ticks / TICK_RATE
+    return {'variant': variant, 'seed': seed, 'survival_s': survival, 'died': game.game_over, 'kills': game.score,
+            'kills_per_min': game.score / (survival / 60) if survival else 0.0, 'final_level': game.player.level,
+            'level_curve': levels, 'evolution_s': evolved_at, 'wall_s': time.perf_counter() - started}
+
+# --- 汇总 ---
+def summarize(variants, results, minutes):
+    rows = []
+    for index, overrides in enumerate(variants):
+        runs = [r for r in results if r['variant'] == index]
+        if not runs: continue
+        survival = sorted(r['survival_s'] for r in runs); evolutions = [r['evolution_s'] for r in runs if r['evolution_s'] is not None]
+        # 最后不满一分钟的部分也占一格，取该局结束时的等级
+        curve = [statistics.mean(r['level_curve'][m] if m < len(r['level_curve']) else r['final_level'] for r in runs) for m in range(math.ceil(minutes))]
+        rows.append({'variant': index, 'overrides': overrides, 'runs': len(runs),
+                     'survival_p50': statistics.median(survival), 'survival_p10': survival[len(survival) // 10],
+                     'death_rate': sum(r['died'] for r in runs) / len(runs), 'kills_per_min': statistics.mean(r['kills_per_min'] for r in runs),
+                     'level_curve': [round(level, 1) for level in curve], 'evolution_rate': len(evolutions) / len(runs),
+                     'evolution_p50': statistics.median(evolutions) if evolutions else None})
+    return rows
+
+def print_table(rows):
+    print(f"{'#':>3} {'runs':>5} {'存活p50':>8} {'存活p10':>8} {'死亡率':>6} {'击杀/分':>8} {'进化率':>6} {'进化p50':>8}  每分钟等级  参数")
+    for row in rows:
+        evolution = f"{row['evolution_p50']:8.0f}" if row['evolution_p50'] is not None else f"{'-':>8}"
+        print(f"{row['variant']:>3} {row['runs']:>5} {row['survival_p50']:8.0f} {row['survival_p10']:8.0f} {row['death_rate']:6.0%} "
+              f"{row['kills_per_min']:8.1f} {row['evolution_rate']:6.0%} {evolution}  {'/'.join(map(str, row['level_curve']))}  "
+              f"{', '.join(f'{key}={value:g}' if isinstance(value, (int, float)) else f'{key}={value}' for key, value in row['overrides'].items())}")
+
+def write_csv(path, variants, results):
+    keys = sorted({key for overrides in variants for key in overrides})
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['variant', 'seed', *keys, 'survival_s', 'died', 'kills', 'kills_per_min', 'final_level', 'evolution_s', 'level_curve'])
+        for r in sorted(results, key=lambda r: (r['variant'], r['seed'])):
+            overrides = variants[r['variant']]
+            writer.writerow([r['variant'], r['seed'], *(overrides.get(key, '') for key in keys), f"{r['survival_s']:.2f}", int(r['died']), r['kills'],
+                             f"{r['kills_per_min']:.2f}", r['final_level'], '' if r['evolution_s'] is None else f"{r['evolution_s']:.2f}", ' '.join(map(str, r['level_curve']))])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无头蒙特卡洛平衡性测试：在多核上批量跑 config.json 的各个变体")
+    parser.add_argument('--config', default='config.json', help="基础配置文件")
+    parser.add_argument('--spec', help="参数网格/采样描述的 JSON 文件；不给则只跑基础配置")
+    parser.add_argument('--runs', type=int, default=20, help="每个变体跑多少个种子")
+    parser.add_argument('--minutes', type=float, default=5, help="每局最长模拟时长（游戏内分钟）")
+    parser.add_argument('--seed', type=int, default=1, help="起始种子，也用于参数采样")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument('--output', default='balance_results.csv', help="逐局结果 CSV")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f: base = json.load(f)
+    spec = {}
+    if args.spec:
+        with open(args.spec) as f: spec = json.load(f)
+    try:
+        variants = expand_spec(spec, random.Random(args.seed))
+        configs = [build_config(base, overrides) for overrides in variants]
+    except ConfigError as e: parser.exit(1, f"错误：{e}\n")
+
+    # 同一组种子用在所有变体上，变体之间的差异不混入随机波动
+    tasks = [(index, args.seed + run, config, args.minutes) for run in range(args.runs) for index, config in enumerate(configs)]
+    print(f"{len(variants)} 个变体 x {args.runs} 局 = {len(tasks)} 局，{args.workers} 个进程")
+    started = time.perf_counter(); results = []
+    pool = multiprocessing.Pool(args.workers)
+    # 每局耗时差别很大（早死的局很短），用小块无序分发让各进程负载均衡
+    for done, result in enumerate(pool.imap_unordered(run_one, tasks, chunksize=1), 1):
+        results.append(result)
+        if done % max(1, len(tasks) // 20) == 0 or done == len(tasks): print(f"\r已完成 {done}/{len(tasks)}", end='', flush=True)
+    pool.close(); pool.join()
+    elapsed = time.perf_counter() - started; simulated = sum(r['wall_s'] for r in results)
+    print(f"\n用时 {elapsed:.1f} s，单局累计 {simulated:.1f} s，并行效率 {simulated / elapsed / args.workers:.0%}")
+
+    print_table(summarize(variants, results, args.minutes))
+    write_csv(args.output, variants, results)
+    print(f"逐局结果已写入 {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy'); os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy
+import pygame
+
+from gemini_survivor import Game, OrbitWeapon
+
+# --- 场景搭建 ---
+def fill_enemies(game, count, radius=900):
+    # 每帧把敌人补到 count 个，随机撒在玩家周围；补充发生在计时区间之外
+    cx, cy = game.player.rect.center
+    while len(game.enemies) < count:
+        roll = game.rng.random()
+        enemy = game.spawn_enemy('boss' if roll < 0.01 else 'tank' if roll < 0.2 else 'enemy')
+        enemy.place(cx + game.rng.uniform(-radius, radius), cy + game.rng.uniform(-radius, radius))
+
+def fill_gems(game, count, radius=1200):
+    # 开局一次性铺满宝石，之后看合并与磁铁拾取能否把数量压下来
+    cx, cy = game.player.rect.center
+    while len(game.experience_gems) < count:
+        gem = game.gem_pool.acquire(game, (cx + game.rng.uniform(-radius, radius), cy + game.rng.uniform(-radius, radius)), game.rng.randint(1, 20))
+        game.experience_gems.add(gem); game.gem_grid.insert(gem)
+
+def max_out(game):
+    # 拿齐所有武器和被动并全部升满，配方满足时武器会自动进化
+    for name, weapon_class in game.weapon_pool.items():
+        game.apply_upgrade({"type": "new_weapon", "name": name, "class": weapon_class, "text": "", "level": 0})
+    for key, passive in game.stats.passives.items():
+        for _ in range(passive.max_level): game.apply_upgrade({"type": "passive", "key": key, "text": passive.name, "level": 0})
+    upgraded = True
+    while upgraded:
+        upgraded = False
+        for weapon in list(game.weapon_instances.values()):
+            for key, (text, max_level) in weapon.upgrade_options.items():
+                level = getattr(weapon, f"{key}_level") if isinstance(weapon, OrbitWeapon) else weapon.level
+                if level < max_level:
+                    game.apply_upgrade({"type": "weapon_upgrade", "weapon": weapon, "key": key, "text": text, "level": level}); upgraded = True; break
+            if upgraded: break
+
+SCENARIOS = {
+    'enemies_500': {'enemies': 500},
+    'enemies_2000': {'enemies': 2000},
+    'enemies_10000': {'enemies': 10000},
+    'maxed_weapons_2000': {'enemies': 2000, 'max_out': True},
+    'gem_floor_5000': {'gems': 5000, 'max_out': True},
+}
+
+# --- 计时 ---
+def percentiles(samples):
+    samples = numpy.asarray(samples) * 1000
+    return {'mean': float(samples.mean()), 'p50': float(numpy.percentile(samples, 50)), 'p90': float(numpy.percentile(samples, 90)),
+            'p99': float(numpy.percentile(samples, 99)), 'max': float(samples.max())}
+
+def run_scenario(name, spec, frames, warmup, seed, snapshot=None):
+    game = Game(headless=True, seed=seed)
+    if snapshot: game.load_snapshot(snapshot)  # 直接从存档的后期局面开始，场景的实体再叠加上去
+    game.show_damage_numbers = True; game.player.invincible = True
+    if spec.get('max_out'): max_out(game)
+    fill_gems(game, spec.get('gems', 0))
+    update_times = []; draw_times = []; entity_updates = 0
+    for frame in range(warmup + frames):
+        fill_enemies(game, spec.get('enemies', 0))
+        if game.level_up_state: game.apply_upgrade(game.level_up_choices[0])
+        entities = len(game.all_sprites) + len(game.gem_store)
+        start = time.perf_counter(); game.update(); updated = time.perf_counter(); game.draw(); drawn = time.perf_counter()
+        if frame >= warmup:
+            update_times.append(updated - start); draw_times.append(drawn - updated); entity_updates += entities
+    return {'frames': frames, 'update_ms': percentiles(update_times), 'draw_ms': percentiles(draw_times),
+            'frame_ms': percentiles(numpy.add(update_times, draw_times)), 'entities_per_second': entity_updates / sum(update_times),
+            'final_counts': {'enemies': len(game.enemies), 'gems': len(game.experience_gems), 'projectiles': len(game.projectiles), 'axes': len(game.axes)}}
+
+# --- 回归对比 ---
+def compare(results, baseline, tolerance):
+    # 以 p50/p99 帧耗时对比基线，变慢超过 tolerance 视为回归
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None: continue
+        for metric in ('p50', 'p99'):
+            old = base['frame_ms'][metric]; new = result['frame_ms'][metric]; change = (new - old) / old if old else 0.0
+            flag = ' <-- 回归' if change > tolerance else ''
+            print(f"{name:22} frame {metric}: {old:8.3f} -> {new:8.3f} ms ({change:+.1%}){flag}")
+            if flag: regressions.append((name, metric))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无头性能基准：逐帧统计 update/draw 耗时")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument('--frames', type=int, default=300); parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1234); parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="与之对比的基线结果文件"); parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--snapshot', help="从这个快照文件（F5 快速存档或 crash.gss）开始每个场景")
+    args = parser.parse_args(argv)
+
+    results = {'meta': {'python': platform.python_version(), 'pygame': pygame.version.ver, 'numpy': numpy.__version__,
+                        'platform': platform.platform(), 'frames': args.frames, 'warmup': args.warmup, 'seed': args.seed,
+                        'snapshot': args.snapshot, 'time': time.time()},
+               'scenarios': {}}
+    for name in args.scenarios.split(','):
+        result = results['scenarios'][name] = run_scenario(name, SCENARIOS[name], args.frames, args.warmup, args.seed, args.snapshot)
+        print(f"{name:22} update p50 {result['update_ms']['p50']:7.3f} p99 {result['update_ms']['p99']:7.3f} | "
+              f"draw p50 {result['draw_ms']['p50']:7.3f} p99 {result['draw_ms']['p99']:7.3f} ms | {result['entities_per_second']:,.0f} entities/s")
+    with open(args.output, 'w') as f: json.dump(results, f, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        if compare(results, baseline, args.tolerance): return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,23 @@ import random
 import math
 import numpy
 import json
+import csv
+import gc
+import sys
+import argparse
+import heapq
+import hashlib
+import struct
+import zlib
+import os
+import time
+import itertools
+import tracemalloc
+import weakref
+from dataclasses import dataclass, field
+from types import FrameType
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, defaultdict, deque
 
 # --- 常量 ---
 SCREEN_WIDTH = 1280
@@ -13,10 +30,37 @@ TANK_ENEMY_SIZE = 50
 BOSS_ENEMY_SIZE = 100
 XP_GEM_SIZE = 15
 WORLD_SIZE = (3000, 3000)
+TICK_RATE = 60
+TICK_MS = 1000 / TICK_RATE
+MAX_CATCHUP_TICKS = 5
+AXE_ROTATION_STEP = 10  # 斧头每帧转 10 度，预渲染 36 个朝向
+ORBIT_HIT_COOLDOWN_MS = 500  # 环绕物对同一敌人的连击间隔
+PARTICLE_LIFETIME_TICKS = 600  # 飞行物最长存活 10 秒，正常情况下早已飞出视野
+AXE_HIT_IMMUNITY_MS = 5000  # 一把斧头对同一敌人只打一次；斧头飞出视野远早于此
+SPAWN_RING_RADIUS = max(SCREEN_WIDTH, SCREEN_HEIGHT) / 2 + 50  # 刷怪圈在屏幕外一圈
+RECYCLE_CHECK_TICKS = 30  # 每半秒检查一次跑远的敌人
+BACKGROUND_CHUNK_SIZE = 250  # 背景分块大小；一屏最多露出 7x4 块
+BACKGROUND_CHUNK_CACHE = 48  # 最多常驻的背景块数，约 12 MB
+FLOW_CELL_SIZE = 60  # 流场格子大小
+FLOW_WINDOW = 16  # 玩家换格时只重算周围 16 格以内的流场
+LOD_NEAR_MARGIN = 200  # 视野外 200 像素以内仍算近处：盖住飞行物的存活范围（视野外 100 像素）再加上最大敌人的半径
+# 碰撞网格的格子大小：普通敌人大多只占一格，Boss 最多跨四格
+SPATIAL_CELL_SIZE = max(ENEMY_SIZE * 2, BOSS_ENEMY_SIZE // 2)
+
+# F5/F9 快速存读档与崩溃时自动存档的位置
+QUICKSAVE_PATH = 'quicksave.gss'
+CRASH_SNAPSHOT_PATH = 'crash.gss'
+
+# 合成音效的磁盘缓存目录
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.asset_cache')
 
 # --- 音量设置 ---
 MUSIC_VOLUME = 0.3
 SFX_VOLUME = 0.5
+SFX_CHANNELS = 12  # 音效通道池大小；0 号通道留给背景音乐
+# 每种音效的 (最短间隔 ms, 同时发声上限, 优先级)；通道用完时高优先级可以抢占低优先级
+SOUND_LIMITS = {'shoot': (60, 2, 1), 'enemy_hit': (50, 3, 0), 'gem_pickup': (40, 2, 0),
+                'player_hit': (150, 1, 2), 'level_up': (0, 1, 3), 'evolve': (0, 1, 3)}
 
 # --- 颜色 ---
 WHITE = (255, 255, 255); BLACK = (0, 0, 0); RED = (255, 0, 0); BLUE = (0, 0, 255)
@@ -24,8 +68,18 @@ GREEN = (0, 255, 0); YELLOW = (255, 255, 255); GREY = (100, 100, 100); CYAN = (0
 PURPLE = (128, 0, 128); DARK_GREEN = (0, 100, 0); ORANGE = (255, 165, 0); GOLD = (255, 215, 0)
 BROWN = (139, 69, 19); DARK_GREY = (40, 40, 40); LIGHT_BLUE = (173, 216, 230)
 
+# --- 静音占位 ---
+class SilentSound:
+    # 无头模式下代替 Sound/Channel，所有调用都什么也不做
+    def play(self, *args, **kwargs): pass
+    def set_volume(self, volume): pass
+    def pause(self): pass
+    def unpause(self): pass
+    def stop(self): pass
+    def flush(self): pass
+
 # --- 声音生成函数 ---
-def generate_sound(frequency, duration, sample_rate=44100):
+def synthesize_tone(frequency, duration, sample_rate=44100):
     n_samples = int(sample_rate * duration)
     t = numpy.linspace(0, duration, n_samples, False)
     audio = numpy.sin(frequency * t * 2 * numpy.pi)
@@ -33,7 +87,73 @@ def generate_sound(frequency, duration, sample_rate=44100):
     audio *= decay
     audio *= 32767 / numpy.max(numpy.abs(audio))
     audio = numpy.repeat(audio[:, numpy.newaxis], 2, axis=1)
-    return pygame.sndarray.make_sound(audio.astype(numpy.int16))
+    return audio.astype(numpy.int16)
+
+def load_tone(frequency, duration, sample_rate=44100):
+    # PCM 按 (频率, 时长, 采样率) 缓存在磁盘上，再次启动时直接内存映射读取
+    path = os.path.join(ASSET_CACHE_DIR, f"tone_{frequency}_{duration}_{sample_rate}.npy")
+    try: return numpy.load(path, mmap_mode='r')
+    except (OSError, ValueError, EOFError): pass
+    pcm = synthesize_tone(frequency, duration, sample_rate)
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True); temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f: numpy.save(f, pcm)
+        os.replace(temp_path, path)
+    except OSError: pass
+    return pcm
+
+def generate_sound(frequency, duration, sample_rate=44100):
+    return pygame.sndarray.make_sound(load_tone(frequency, duration, sample_rate))
+
+class LazySound:
+    # 在后台线程生成的音效；还没准备好时 play() 直接跳过
+    def __init__(self, future): self.future = future
+
+    def ready(self): return self.future.done()
+
+    @property
+    def sound(self): return self.future.result()
+
+    def play(self, *args, **kwargs):
+        if self.future.done(): return self.future.result().play(*args, **kwargs)
+
+    def set_volume(self, volume): self.future.add_done_callback(lambda future: future.result().set_volume(volume))
+
+class SoundDispatcher:
+    # 所有音效都经过这里：同一帧内重复触发只播一次，按音效限制最短间隔和同时发声数，
+    # 只用自己的通道池播放，不碰背景音乐所在的 0 号通道
+    def __init__(self, sounds, channel_count=SFX_CHANNELS, limits=SOUND_LIMITS):
+        pygame.mixer.set_num_channels(channel_count + 1); pygame.mixer.set_reserved(1)
+        self.sounds = sounds; self.limits = limits; self.pending = set()
+        self.channels = [pygame.mixer.Channel(i) for i in range(1, channel_count + 1)]
+        self.owner = {}; self.last_played = {}
+
+    def play(self, name): self.pending.add(name)
+
+    def flush(self):
+        if not self.pending: return
+        now = time.perf_counter() * 1000
+        for name in sorted(self.pending, key=lambda name: -self.limits.get(name, (0, 1, 0))[2]):
+            interval, max_voices, priority = self.limits.get(name, (0, 1, 0))
+            if now - self.last_played.get(name, -math.inf) < interval: continue
+            sound = self.sounds[name]
+            if isinstance(sound, LazySound):
+                if not sound.ready(): continue
+                sound = sound.sound
+            voices = [channel for channel in self.channels if self.owner.get(channel) == name and channel.get_busy()]
+            if len(voices) >= max_voices: continue
+            channel = self.free_channel(priority)
+            if channel is None: continue
+            channel.play(sound); self.owner[channel] = name; self.last_played[name] = now
+        self.pending.clear()
+
+    def free_channel(self, priority):
+        for channel in self.channels:
+            if not channel.get_busy(): return channel
+        # 通道全忙：抢占优先级最低的一个，前提是比要播的低
+        victim = min(self.channels, key=lambda channel: self.limits.get(self.owner.get(channel), (0, 1, 0))[2])
+        if self.limits.get(self.owner.get(victim), (0, 1, 0))[2] < priority: victim.stop(); return victim
+        return None
 
 # --- 镜头类 ---
 class Camera:
@@ -51,46 +171,791 @@ class Camera:
         x = max(-(self.width - SCREEN_WIDTH), x); y = max(-(self.height - SCREEN_HEIGHT), y)
         self.camera = pygame.Rect(x, y, self.width, self.height)
 
+# --- 分块背景 ---
+class ChunkedBackground:
+    # 背景按块现画现用：只生成镜头附近的块，按最近使用淘汰，每帧只贴视野内的部分
+    def __init__(self, world_size=WORLD_SIZE, chunk_size=BACKGROUND_CHUNK_SIZE, capacity=BACKGROUND_CHUNK_CACHE):
+        self.world_size = world_size; self.chunk_size = chunk_size; self.capacity = capacity; self.chunks = OrderedDict()
+
+    def chunk(self, cx, cy):
+        key = (cx, cy); image = self.chunks.get(key)
+        if image is None:
+            image = self.chunks[key] = self.create_chunk(cx, cy)
+            if len(self.chunks) > self.capacity: self.chunks.popitem(last=False)
+        else: self.chunks.move_to_end(key)
+        return image
+
+    def create_chunk(self, cx, cy):
+        size = self.chunk_size; left = cx * size; top = cy * size
+        width = min(size, self.world_size[0] - left); height = min(size, self.world_size[1] - top)
+        image = pygame.Surface((width, height)); image.fill(DARK_GREY)
+        # 网格线按世界坐标每 50 像素一条，块与块之间无缝
+        for x in range(-left % 50, width, 50): pygame.draw.line(image, GREY, (x, 0), (x, height))
+        for y in range(-top % 50, height, 50): pygame.draw.line(image, GREY, (0, y), (width, y))
+        if pygame.display.get_surface() is not None: image = image.convert()
+        return image
+
+    def draw(self, screen, view):
+        ox, oy = view.topleft; view = view.clip(pygame.Rect((0, 0), self.world_size)); size = self.chunk_size; blits = []
+        for cy in range(view.top // size, (view.bottom - 1) // size + 1):
+            for cx in range(view.left // size, (view.right - 1) // size + 1):
+                chunk_rect = pygame.Rect(cx * size, cy * size, size, size); visible = chunk_rect.clip(view)
+                blits.append((self.chunk(cx, cy), (visible.x - ox, visible.y - oy), visible.move(-chunk_rect.x, -chunk_rect.y)))
+        screen.blits(blits, doreturn=False)
+
+# --- 贴图缓存 ---
+class SpriteCache:
+    # 每种贴图只画一次并转换成显示格式，所有实例共用同一个 Surface
+    def __init__(self): self.images = {}
+
+    def get(self, key, builder):
+        image = self.images.get(key)
+        if image is None:
+            image = builder()
+            if pygame.display.get_surface() is not None: image = image.convert_alpha()
+            self.images[key] = image
+        return image
+
+    def rotations(self, key, builder, step):
+        frames = self.images.get(('rotations', key, step))
+        if frames is None:
+            base = self.get(key, builder)
+            frames = self.images[('rotations', key, step)] = [pygame.transform.rotate(base, angle) for angle in range(0, 360, step)]
+        return frames
+
+sprite_cache = SpriteCache()
+
+# --- 文字缓存 ---
+class TextCache:
+    # 文字贴图按 (字体, 内容, 颜色) 记忆，超出容量时淘汰最久未用的；数字由预先栅格化的字形拼接
+    def __init__(self, capacity=512):
+        self.capacity = capacity; self.entries = OrderedDict(); self.glyphs = {}
+
+    def lookup(self, key, builder):
+        image = self.entries.get(key)
+        if image is None:
+            image = self.entries[key] = builder()
+            if len(self.entries) > self.capacity: self.entries.popitem(last=False)
+        else: self.entries.move_to_end(key)
+        return image
+
+    def label(self, font, text, color): return self.lookup((font, text, color), lambda: font.render(text, True, color))
+
+    def digits(self, font, color):
+        glyphs = self.glyphs.get((font, color))
+        if glyphs is None: glyphs = self.glyphs[(font, color)] = {char: font.render(char, True, color) for char in '-0123456789'}
+        return glyphs
+
+    def compose(self, font, value, color):
+        glyphs = [self.digits(font, color)[char] for char in str(value)]
+        image = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), font.get_height()), pygame.SRCALPHA); x = 0
+        for glyph in glyphs: image.blit(glyph, (x, 0), special_flags=pygame.BLEND_RGBA_MAX); x += glyph.get_width()
+        return image
+
+    def number(self, font, value, color, alpha=255):
+        # 透明度量化为 16 档，同一个数字的淡出帧在所有实例间共享
+        level = max(0, min(255, int(alpha))) >> 4
+        base = self.lookup((font, value, color, 15), lambda: self.compose(font, value, color))
+        if level == 15: return base
+        def fade():
+            image = base.copy(); image.set_alpha(level * 17); return image
+        return self.lookup((font, value, color, level), fade)
+
+# --- 对象池 ---
+class SpritePool:
+    # 短命精灵回收复用；空闲列表超过容量时多余的精灵直接丢弃
+    def __init__(self, sprite_class, capacity):
+        self.sprite_class = sprite_class; self.capacity = capacity; self.free = []
+
+    def acquire(self, *args):
+        if self.free: sprite = self.free.pop(); sprite.reset(*args)
+        else: sprite = self.sprite_class(*args)
+        sprite.pool = self
+        return sprite
+
+    def release(self, sprite):
+        if len(self.free) < self.capacity: self.free.append(sprite)
+
+class PooledSprite(pygame.sprite.Sprite):
+    # 构造只发生一次，之后每次从池中取出都重新调用 reset()；kill() 时自动归还
+    pool = None
+
+    def __init__(self, *args):
+        super().__init__(); self.reset(*args)
+
+    def kill(self):
+        super().kill()
+        if self.pool is not None:
+            pool = self.pool; self.pool = None; pool.release(self)
+
+# --- 模拟时钟类 ---
+class SimulationClock:
+    # 游戏时间只随固定步长的 tick 前进，与真实时间和帧率无关
+    def __init__(self, tick_ms=TICK_MS):
+        self.tick_ms = tick_ms; self.ticks = 0; self.timers = {}
+
+    @property
+    def now(self): return self.ticks * self.tick_ms
+
+    def set_timer(self, timer_id, interval):
+        if interval <= 0: self.timers.pop(timer_id, None)
+        else: self.timers[timer_id] = [interval, self.now + interval]
+
+    def advance(self):
+        self.ticks += 1; now = self.now; fired = []
+        for timer_id, timer in self.timers.items():
+            while timer[1] <= now: fired.append(timer_id); timer[1] += timer[0]
+        return fired
+
+class HitCooldowns:
+    # 多段伤害武器共用的免伤表，键为 (来源 uid, 敌人 uid)，不持有精灵引用；
+    # 时间轮按到期 tick 分桶，登记和过期都是 O(1)，死掉的敌人的条目到期后随桶一起丢掉
+    def __init__(self, tick_ms=TICK_MS):
+        self.tick_ms = tick_ms; self.tick = 0; self.expiry = {}; self.wheel = defaultdict(list)
+
+    def __len__(self): return len(self.expiry)
+
+    def try_hit(self, source, target, duration):
+        key = (source.uid, target.uid)
+        if key in self.expiry: return False
+        due = self.tick + max(1, math.ceil(duration / self.tick_ms))
+        self.expiry[key] = due; self.wheel[due].append(key)
+        return True
+
+    def advance(self, tick):
+        expiry = self.expiry; wheel = self.wheel
+        while self.tick < tick:
+            self.tick += 1
+            for key in wheel.pop(self.tick, ()): del expiry[key]
+
+# --- 输入录制与回放 ---
+MOVE_LEFT = 1; MOVE_RIGHT = 2; MOVE_UP = 4; MOVE_DOWN = 8
+CMD_CHOICE = 1; CMD_LEVEL_UP = 2; CMD_GAIN_XP = 3; CMD_INVINCIBLE = 4; CMD_QUALITY = 5
+
+class InputLog:
+    # 文件布局：头部 | zlib 压缩的逐 tick 移动位掩码（每 tick 一字节）| 命令表 (tick, 类型, 参数)
+    MAGIC = b'GSRP'; VERSION = 1
+    HEADER = struct.Struct('<4sHQ20sIII'); COMMAND = struct.Struct('<IBi')
+
+    def __init__(self, seed, config_hash, movement=None, commands=None):
+        self.seed = seed; self.config_hash = config_hash
+        self.movement = movement if movement is not None else bytearray(); self.commands = commands if commands is not None else []
+
+    def save(self, path):
+        packed = zlib.compress(bytes(self.movement), 9)
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.config_hash, len(self.movement), len(packed), len(self.commands)))
+            f.write(packed)
+            for command in self.commands: f.write(self.COMMAND.pack(*command))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f: data = f.read()
+        magic, version, seed, config_hash, ticks, packed_size, command_count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION: raise ValueError(f"{path} 不是可识别的录像文件")
+        offset = cls.HEADER.size; movement = zlib.decompress(data[offset:offset + packed_size]); offset += packed_size
+        if len(movement) != ticks: raise ValueError(f"{path} 录像数据不完整")
+        commands = [cls.COMMAND.unpack_from(data, offset + i * cls.COMMAND.size) for i in range(command_count)]
+        return cls(seed, config_hash, bytearray(movement), commands)
+
+class InputRecorder:
+    def __init__(self, path, seed, config_hash): self.path = path; self.log = InputLog(seed, config_hash)
+    def movement(self, mask): self.log.movement.append(mask)
+    def command(self, tick, kind, arg): self.log.commands.append((tick, kind, arg))
+    def close(self): self.log.save(self.path)
+
+class InputReplayer:
+    def __init__(self, log): self.log = log; self.cursor = 0; self.next_command = 0
+
+    @property
+    def finished(self): return self.cursor >= len(self.log.movement)
+
+    def movement(self):
+        mask = self.log.movement[self.cursor]; self.cursor += 1
+        return mask
+
+    def pending(self, tick):
+        commands = self.log.commands
+        while self.next_command < len(commands) and commands[self.next_command][0] <= tick:
+            _, kind, arg = commands[self.next_command]; self.next_command += 1
+            yield kind, arg
+
+# --- 存档快照 ---
+class Snapshot:
+    # 文件布局：头部 | zlib 压缩的段序列；每段 (标签, 条数, 字节数, 数据)
+    # 标量状态放一段 JSON，实体按类型各存一段定长记录数组，整段直接 tobytes/frombuffer
+    # 实体连同仓库行号和 uid 一起存：LOD 分片、命中顺序和免伤表都依赖它们，读档后接着跑才能和原局逐 tick 一致
+    MAGIC = b'GSSN'; VERSION = 2
+    HEADER = struct.Struct('<4sHQ20sIII'); SECTION = struct.Struct('<4sII')
+    ENEMY = numpy.dtype([('kind', 'u1'), ('row', '<i8'), ('uid', '<i8'), ('x', '<f8'), ('y', '<f8'), ('health', '<f8'), ('speed', '<f8'), ('damage', '<f8'), ('xp', '<i4')])
+    PARTICLE = numpy.dtype([('kind', 'u1'), ('row', '<i8'), ('uid', '<i8'), ('x', '<f8'), ('y', '<f8'), ('vx', '<f8'), ('vy', '<f8'), ('gravity', '<f8'), ('angle', '<f8'),
+                            ('spin', '<f8'), ('half', '<f8'), ('damage', '<f8'), ('pierce', '<i8'), ('hits', '<i8'), ('lifetime', '<i8')])
+    PARTICLE_FIELDS = PARTICLE.names[3:]  # 与 ParticleStore 的列一一对应
+    GEM = numpy.dtype([('row', '<i8'), ('x', '<f8'), ('y', '<f8'), ('xp_value', '<i8'), ('merged', 'u1')])
+    CHEST = numpy.dtype([('x', '<i4'), ('y', '<i4')])
+    DTYPES = {b'ENMY': ENEMY, b'PART': PARTICLE, b'GEMS': GEM, b'CHST': CHEST}
+
+    def __init__(self, seed, config_hash, ticks, meta, arrays):
+        self.seed = seed; self.config_hash = config_hash; self.ticks = ticks; self.meta = meta; self.arrays = arrays
+
+    def save(self, path):
+        sections = [(b'META', 1, json.dumps(self.meta, separators=(',', ':')).encode())]
+        sections += [(tag, len(array), array.tobytes()) for tag, array in self.arrays.items()]
+        body = b''.join(self.SECTION.pack(tag, count, len(data)) + data for tag, count, data in sections); packed = zlib.compress(body, 1)
+        # 先写临时文件再替换，存档途中崩溃也不会留下半个文件
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.config_hash, self.ticks, len(body), len(packed))); f.write(packed)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f: data = f.read()
+        if len(data) < cls.HEADER.size: raise ValueError(f"{path} 不是可识别的存档文件")
+        magic, version, seed, config_hash, ticks, body_size, packed_size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION: raise ValueError(f"{path} 不是可识别的存档文件")
+        body = zlib.decompress(data[cls.HEADER.size:cls.HEADER.size + packed_size])
+        if len(body) != body_size: raise ValueError(f"{path} 存档数据不完整")
+        meta = None; arrays = {}; offset = 0
+        while offset < len(body):
+            tag, count, size = cls.SECTION.unpack_from(body, offset); offset += cls.SECTION.size
+            chunk = body[offset:offset + size]; offset += size
+            if tag == b'META': meta = json.loads(chunk)
+            elif tag in cls.DTYPES: arrays[tag] = numpy.frombuffer(chunk, dtype=cls.DTYPES[tag], count=count)
+        return cls(seed, config_hash, ticks, meta, arrays)
+
+# --- 帧分析器 ---
+class NullProfiler:
+    # 关闭分析时的占位：每帧只多几次空调用
+    enabled = False
+    def start(self): return 0.0
+    def mark(self, phase, since): return 0.0
+    def end_frame(self, counts): pass
+    def close(self): pass
+
+class FrameProfiler:
+    PHASES = ('events', 'timers', 'sprites', 'grid', 'particles', 'hits', 'orbiters', 'pickups', 'draw')
+    enabled = True
+
+    def __init__(self, window=300, export_path=None):
+        self.frame = 0; self.counts = {}; self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.history = {name: deque(maxlen=window) for name in self.PHASES + ('frame',)}
+        self.export_path = export_path; self.export_file = open(export_path, 'w', newline='') if export_path else None; self.csv_writer = None
+
+    def start(self): return time.perf_counter()
+
+    def mark(self, phase, since):
+        now = time.perf_counter(); self.phases[phase] += now - since
+        return now
+
+    def end_frame(self, counts):
+        record = {'frame': self.frame}; total = 0.0
+        for phase, seconds in self.phases.items():
+            ms = seconds * 1000; total += ms; self.history[phase].append(ms); record[f'{phase}_ms'] = round(ms, 4); self.phases[phase] = 0.0
+        self.history['frame'].append(total); record['frame_ms'] = round(total, 4); self.counts = counts; self.frame += 1
+        if self.export_file is not None: record.update(counts); self.write(record)
+
+    def write(self, record):
+        # 按扩展名选择 CSV 或 JSONL，每帧一行
+        if self.export_path.endswith('.csv'):
+            if self.csv_writer is None: self.csv_writer = csv.DictWriter(self.export_file, fieldnames=list(record)); self.csv_writer.writeheader()
+            self.csv_writer.writerow(record)
+        else: self.export_file.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        return {name: (sum(samples) / len(samples), float(numpy.percentile(samples, 99))) for name, samples in self.history.items() if samples}
+
+    def close(self):
+        if self.export_file is not None: self.export_file.close(); self.export_file = None
+
+# --- 内存普查 ---
+def surface_bytes(image): return image.get_pitch() * image.get_height()
+
+def current_rss():
+    # 常驻内存；只在有 /proc 的系统上可读
+    try:
+        with open('/proc/self/statm') as f: return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError): return None
+
+class MemoryCensus:
+    # 浸泡测试用：定期统计各类精灵和各分组的数量、近似字节数、数组仓库与缓存占用、tracemalloc 热点，逐行写入 JSONL。
+    # 泄漏判定：精灵已经 kill()、不在任何对象池的空闲列表里，并且隔一个统计周期后仍未被回收。
+    # 只看一次会误报，比如刚被打死、还留在本 tick 空间网格里的敌人
+    TOP_ALLOCATIONS = 10; LEAK_EXAMPLES = 5
+
+    def __init__(self, path, interval_ticks, trace_frames=1):
+        self.path = path; self.interval = interval_ticks; self.next_tick = 0; self.file = open(path, 'w')
+        self.tracked = weakref.WeakSet(); self.suspects = weakref.WeakSet(); self.previous = None
+        self.owns_tracing = not tracemalloc.is_tracing()
+        if self.owns_tracing: tracemalloc.start(trace_frames)
+
+    def track(self, sprite): self.tracked.add(sprite)
+
+    def poll(self, game):
+        # 新开一局或读档时 tick 会倒退，按新的 tick 重新排期
+        ticks = game.sim_clock.ticks
+        if ticks >= self.next_tick or ticks + self.interval < self.next_tick: self.next_tick = ticks + self.interval; self.record(game)
+
+    def record(self, game):
+        gc.collect()  # 只在环里互相引用的死精灵会被这里回收，不算泄漏
+        state = vars(game)
+        groups = {name: value for name, value in state.items() if isinstance(value, pygame.sprite.AbstractGroup)}
+        for group in groups.values(): self.tracked.update(group)  # 宝石之类不经过 add_sprite 的也记上
+        pooled = {id(sprite) for value in state.values() if isinstance(value, SpritePool) for sprite in value.free}
+        classes = {}; dead = []
+        for sprite in list(self.tracked):
+            entry = classes.setdefault(type(sprite).__name__, {'live': 0, 'pooled': 0, 'orphaned': 0, 'leaked': 0, 'bytes': 0})
+            entry['bytes'] += sys.getsizeof(sprite) + sys.getsizeof(vars(sprite))
+            if sprite.alive():
+                entry['live'] += 1
+                # 只剩 all_sprites 这一个分组的精灵不会被任何类型分组更新或碰撞，多半是忘了一起移除
+                if sprite is not game.player and sprite.groups() == [game.all_sprites]: entry['orphaned'] += 1
+            elif id(sprite) in pooled: entry['pooled'] += 1
+            else: dead.append(sprite)
+        leaked = [sprite for sprite in dead if sprite in self.suspects]; self.suspects = weakref.WeakSet(dead)
+        for sprite in leaked: classes[type(sprite).__name__]['leaked'] += 1
+        examples = []
+        for sprite in itertools.islice(leaked, self.LEAK_EXAMPLES):  # 不用推导式和切片，免得它们自己也出现在引用者里
+            examples.append({'type': type(sprite).__name__, 'uid': getattr(sprite, 'uid', None), 'referrers': self.describe_referrers(sprite, (dead, leaked))})
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        top = [self.allocation(stat.traceback[0], stat.size, stat.count) for stat in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]]
+        growth = [self.allocation(stat.traceback[0], stat.size_diff, stat.count_diff)
+                  for stat in snapshot.compare_to(self.previous, 'lineno')[:self.TOP_ALLOCATIONS]] if self.previous is not None else []
+        self.previous = snapshot
+
+        record = {'tick': game.sim_clock.ticks, 'time': time.time(), 'rss_bytes': current_rss(), 'traced_bytes': current, 'traced_peak_bytes': peak,
+                  'classes': classes, 'groups': {name: len(group) for name, group in groups.items()},
+                  'stores': {name: {'rows': len(store), 'capacity': store.capacity, 'bytes': sum(getattr(store, column).nbytes for column, _ in store.FIELDS)}
+                             for name, store in state.items() if isinstance(store, ArrayStore)},
+                  'caches': {'sprite_cache': sum(surface_bytes(image) for value in sprite_cache.images.values() for image in (value if isinstance(value, list) else [value])),
+                             'text_cache': sum(surface_bytes(image) for image in game.text_cache.entries.values()),
+                             'background': sum(surface_bytes(image) for image in game.background.chunks.values())},
+                  'hit_cooldowns': len(game.hit_cooldowns), 'leaks': examples, 'top_allocations': top, 'growth': growth}
+        self.file.write(json.dumps(record) + '\n'); self.file.flush()
+        if leaked: print(f"警告：{len(leaked)} 个已 kill 的精灵仍被引用，例如 {examples[0]}")
+        return record
+
+    @staticmethod
+    def allocation(frame, size, count): return {'where': f"{os.path.basename(frame.filename)}:{frame.lineno}", 'bytes': size, 'count': count}
+
+    @staticmethod
+    def describe_referrers(sprite, ignore):
+        # 说明是谁拉着这个精灵：容器类型，是字典的话再带上对应的键
+        ignore = {id(item) for item in ignore}; holders = []
+        for referrer in gc.get_referrers(sprite):
+            if id(referrer) in ignore or isinstance(referrer, FrameType): continue
+            if isinstance(referrer, dict):
+                # 这里不能写推导式：推导式会把 sprite 装进闭包单元，自己变成一个引用者
+                keys = []
+                for key, value in referrer.items():
+                    if value is sprite: keys.append(repr(key))
+                holders.append(f"dict[{', '.join(keys)[:60]}]")
+            else: holders.append(f"{type(referrer).__name__}(len={len(referrer)})" if hasattr(referrer, '__len__') else type(referrer).__name__)
+        return holders
+
+    def close(self, game=None):
+        if self.file is None: return
+        if game is not None: self.record(game)
+        self.file.close(); self.file = None
+        if self.owns_tracing: tracemalloc.stop()
+
+# --- 画质调节 ---
+@dataclass(frozen=True, slots=True)
+class QualityTier:
+    # damage_number_every: 每几次命中出一个伤害数字（0 为不出）；lod_scale: 远处敌人的 LOD 步长再乘几倍
+    name: str; damage_number_every: int; hit_sounds: bool; gem_merge_scale: float; lod_scale: int
+
+# 由高到低逐级降；前两级只省表现，后面才动到模拟（宝石合并、远处敌人），所以档位切换要走命令录进录像
+QUALITY_TIERS = (QualityTier('full', 1, True, 1.0, 1), QualityTier('reduced fx', 3, False, 1.0, 1),
+                 QualityTier('no fx', 0, False, 0.5, 1), QualityTier('low sim', 0, False, 0.25, 2),
+                 QualityTier('lowest', 0, False, 0.25, 4))
+
+class FrameGovernor:
+    # 看最近一个窗口的平均帧耗时（不含 tick 限帧的等待）：超出预算就降一级，明显低于预算且稳定一段时间才升一级。
+    # 每次换档都清空窗口，等新档位的耗时攒满一个窗口再判断，避免来回抖动
+    def __init__(self, settings): self.settings = settings; self.tier = 0; self.samples = deque(); self.hold = 0
+
+    def observe(self, frame_ms):
+        settings = self.settings; samples = self.samples
+        if not settings.enabled: return None
+        samples.append(frame_ms); self.hold = max(0, self.hold - 1)
+        if len(samples) > settings.window_frames: samples.popleft()
+        if len(samples) < settings.window_frames: return None
+        average = sum(samples) / len(samples)
+        if average > settings.budget_ms * settings.degrade_above and self.tier < len(QUALITY_TIERS) - 1: self.tier += 1
+        elif average < settings.budget_ms * settings.recover_below and self.tier > 0 and not self.hold: self.tier -= 1
+        else: return None
+        samples.clear(); self.hold = settings.recover_hold_frames
+        return self.tier
+
+# --- 空间哈希类 ---
+class SpatialHash:
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size; self.cells = {}; self.spans = {}; self.bounds = None
+
+    def cell_span(self, rect):
+        size = self.cell_size
+        return range(rect.left // size, (rect.right - 1) // size + 1), range(rect.top // size, (rect.bottom - 1) // size + 1)
+
+    def insert(self, sprite):
+        rect = sprite.rect; size = self.cell_size
+        self.insert_span(sprite, rect.left // size, (rect.right - 1) // size, rect.top // size, (rect.bottom - 1) // size)
+
+    def insert_span(self, sprite, x0, x1, y0, y1):
+        cells = self.cells; self.spans[sprite] = (x0, x1, y0, y1)
+        bounds = self.bounds
+        if bounds is None: self.bounds = [x0, x1, y0, y1]
+        else:
+            if x0 < bounds[0]: bounds[0] = x0
+            if x1 > bounds[1]: bounds[1] = x1
+            if y0 < bounds[2]: bounds[2] = y0
+            if y1 > bounds[3]: bounds[3] = y1
+        if x0 == x1 and y0 == y1:
+            cell = cells.get((x0, y0))
+            if cell is None: cells[(x0, y0)] = [sprite]
+            else: cell.append(sprite)
+            return
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1): cells.setdefault((cx, cy), []).append(sprite)
+
+    def remove(self, sprite):
+        span = self.spans.pop(sprite, None)
+        if span is None: return
+        x0, x1, y0, y1 = span
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells[(cx, cy)]; cell.remove(sprite)
+                if not cell: del self.cells[(cx, cy)]
+
+    def move(self, sprite):
+        # 增量更新：只有跨格时才重新分桶
+        rect = sprite.rect; size = self.cell_size
+        if self.spans.get(sprite) != (rect.left // size, (rect.right - 1) // size, rect.top // size, (rect.bottom - 1) // size):
+            self.remove(sprite); self.insert(sprite)
+
+    def rebuild(self, sprites):
+        self.cells.clear(); self.spans.clear(); self.bounds = None; insert = self.insert
+        for sprite in sprites: insert(sprite)
+
+    def rebuild_spans(self, sprites, x0, x1, y0, y1):
+        # 格子范围已由数组仓库批量算好，这里只负责分桶
+        self.cells.clear(); self.spans.clear(); self.bounds = None; insert_span = self.insert_span
+        for sprite, a, b, c, d in zip(sprites, x0.tolist(), x1.tolist(), y0.tolist(), y1.tolist()): insert_span(sprite, a, b, c, d)
+
+    def query(self, rect):
+        # 只检查 rect 覆盖到的格子；已被 kill() 的精灵直接跳过
+        found = {}; cols, rows = self.cell_span(rect)
+        for cx in cols:
+            for cy in rows:
+                for sprite in self.cells.get((cx, cy), ()):
+                    if sprite not in found and sprite.rect.colliderect(rect) and sprite.alive(): found[sprite] = None
+        return list(found)
+
+    def ring(self, cx, cy, radius):
+        if radius == 0: yield (cx, cy); return
+        for x in range(cx - radius, cx + radius + 1): yield (x, cy - radius); yield (x, cy + radius)
+        for y in range(cy - radius + 1, cy + radius): yield (cx - radius, y); yield (cx + radius, y)
+
+    def nearest(self, point, k=1):
+        # 由近到远逐圈搜索格子；第 r 圈里精灵中心到 point 的距离不小于 (r - 1) * cell_size，
+        # 一旦已找到的第 k 近不超过下一圈的下界就可以停止
+        if self.bounds is None or k <= 0: return []
+        px, py = point; size = self.cell_size; cx = int(px) // size; cy = int(py) // size
+        x0, x1, y0, y1 = self.bounds
+        max_radius = max(cx - x0, x1 - cx, cy - y0, y1 - cy)
+        best = {}
+        for radius in range(max_radius + 1):
+            if (2 * radius + 1) ** 2 >= len(self.spans):
+                # 要扫的格子比精灵还多时，直接遍历剩下的精灵更便宜
+                for sprite in self.spans:
+                    if sprite not in best and sprite.alive():
+                        sx, sy = sprite.rect.center; best[sprite] = (sx - px) ** 2 + (sy - py) ** 2
+                break
+            for key in self.ring(cx, cy, radius):
+                for sprite in self.cells.get(key, ()):
+                    if sprite not in best and sprite.alive():
+                        sx, sy = sprite.rect.center; best[sprite] = (sx - px) ** 2 + (sy - py) ** 2
+            if len(best) >= k and heapq.nsmallest(k, best.values())[-1] <= (radius * size) ** 2: break
+        return sorted(best, key=best.get)[:k]
+
+# --- 流场寻路 ---
+class FlowField:
+    # 覆盖 WORLD_SIZE 的网格流场：玩家换格时以玩家格为起点，在周围窗口内做 Dijkstra，
+    # 每格记下走向玩家的下一步方向，敌人查表即可转向；窗口外或没有障碍时直接朝玩家走
+    OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+    def __init__(self, world_size=WORLD_SIZE, cell_size=FLOW_CELL_SIZE, window=FLOW_WINDOW):
+        self.cell_size = cell_size; self.window = window
+        self.cols = -(-world_size[0] // cell_size); self.rows = -(-world_size[1] // cell_size)
+        self.blocked = numpy.zeros((self.rows, self.cols), dtype=bool)
+        self.flow_x = numpy.zeros((self.rows, self.cols)); self.flow_y = numpy.zeros((self.rows, self.cols))
+        self.routed = numpy.zeros((self.rows, self.cols), dtype=bool)
+        self.origin = None; self.routing = False
+        lengths = [math.hypot(ox, oy) for ox, oy in self.OFFSETS]
+        self.unit_x = numpy.array([ox / l for (ox, oy), l in zip(self.OFFSETS, lengths)]); self.unit_y = numpy.array([oy / l for (ox, oy), l in zip(self.OFFSETS, lengths)])
+
+    def cell(self, x, y):
+        return min(max(int(x) // self.cell_size, 0), self.cols - 1), min(max(int(y) // self.cell_size, 0), self.rows - 1)
+
+    def set_obstacle(self, rect, blocked=True):
+        # 障碍按格子标记；改动后下一次 update 强制重算
+        size = self.cell_size
+        self.blocked[max(rect.top // size, 0):max((rect.bottom - 1) // size + 1, 0), max(rect.left // size, 0):max((rect.right - 1) // size + 1, 0)] = blocked
+        self.origin = None
+
+    def update(self, target):
+        cell = self.cell(*target)
+        if cell == self.origin: return
+        self.origin = cell
+        if self.blocked.any(): self.recompute(cell)
+        elif self.routing: self.routed[:] = False; self.routing = False
+
+    def recompute(self, cell):
+        # 窗口内做 Dijkstra：直走代价 1、斜走 √2，得到的是真实路程；只按步数算的 BFS 会让斜走和直走一样便宜
+        cx, cy = cell; w = self.window; size = self.cell_size
+        x0, x1 = max(cx - w, 0), min(cx + w + 1, self.cols); y0, y1 = max(cy - w, 0), min(cy + w + 1, self.rows)
+        blocked = self.blocked[y0:y1, x0:x1]; height, width = blocked.shape; walls = blocked.tolist()
+        # 窗口四周垫一圈不可达的格子，后面取邻格时不用判越界
+        dist = numpy.full((height + 2, width + 2), numpy.inf); grid = dist.tolist()
+        start = (cy - y0, cx - x0); grid[start[0] + 1][start[1] + 1] = 0.0; heap = [(0.0, start)]
+        steps = [(ox, oy, math.hypot(ox, oy)) for ox, oy in self.OFFSETS]
+        while heap:
+            d, (r, c) = heapq.heappop(heap)
+            if d > grid[r + 1][c + 1]: continue
+            for ox, oy, cost in steps:
+                nr = r + oy; nc = c + ox; nd = d + cost
+                if not (0 <= nr < height and 0 <= nc < width) or walls[nr][nc] or grid[nr + 1][nc + 1] <= nd: continue
+                if ox and oy and (walls[r][nc] or walls[nr][c]): continue  # 不许斜穿墙角
+                grid[nr + 1][nc + 1] = nd; heapq.heappush(heap, (nd, (nr, nc)))
+        dist = numpy.array(grid); inner = dist[1:-1, 1:-1]
+        padded_walls = numpy.ones((height + 2, width + 2), dtype=bool); padded_walls[1:-1, 1:-1] = blocked
+        candidates = []
+        for ox, oy, cost in steps:
+            neighbour = dist[1 + oy:1 + oy + height, 1 + ox:1 + ox + width] + cost
+            if ox and oy:
+                corner = padded_walls[1:-1, 1 + ox:1 + ox + width] | padded_walls[1 + oy:1 + oy + height, 1:-1]
+                neighbour = numpy.where(corner, numpy.inf, neighbour)
+            candidates.append(neighbour)
+        candidates = numpy.stack(candidates); shortest = candidates.min(axis=0)
+        # 几个方向一样近时，取最贴近“格子中心指向玩家格中心”直线的那个，免得固定偏向 OFFSETS 里排在前面的斜向
+        cols = numpy.arange(x0, x1); rows = numpy.arange(y0, y1)
+        to_x = numpy.broadcast_to((cx - cols) * size, (height, width)).astype(float); to_y = numpy.broadcast_to(((cy - rows) * size)[:, None], (height, width)).astype(float)
+        alignment = self.unit_x[:, None, None] * to_x + self.unit_y[:, None, None] * to_y
+        best = numpy.where(candidates <= shortest + 1e-9, alignment, -numpy.inf).argmax(axis=0)
+        routed = numpy.isfinite(inner) & (inner > 0)  # 玩家所在格直接朝玩家走
+        self.routed[:] = False; self.routed[y0:y1, x0:x1] = routed
+        self.flow_x[y0:y1, x0:x1] = self.unit_x[best]; self.flow_y[y0:y1, x0:x1] = self.unit_y[best]
+        self.routing = True
+
+    def direction(self, x, y):
+        # 单个查询，O(1)；返回 None 表示该处不需要绕路
+        if not self.routing or not (0 <= x < self.cols * self.cell_size and 0 <= y < self.rows * self.cell_size): return None
+        col = int(x) // self.cell_size; row = int(y) // self.cell_size
+        if not self.routed[row, col]: return None
+        return pygame.math.Vector2(self.flow_x[row, col], self.flow_y[row, col])
+
+    def lookup(self, x, y):
+        # 批量查询：返回每个位置的方向分量和是否走流场的掩码
+        size = self.cell_size
+        inside = (x >= 0) & (x < self.cols * size) & (y >= 0) & (y < self.rows * size)
+        col = numpy.clip(x // size, 0, self.cols - 1).astype(numpy.int64); row = numpy.clip(y // size, 0, self.rows - 1).astype(numpy.int64)
+        return self.flow_x[row, col], self.flow_y[row, col], inside & self.routed[row, col]
+
+# --- 结构数组仓库 ---
+class ArrayStore:
+    FIELDS = ()
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity; self.used = 0; self.free = []
+        self.active = numpy.zeros(capacity, dtype=bool); self.sprites = [None] * capacity
+        for name, dtype in self.FIELDS: setattr(self, name, numpy.zeros(capacity, dtype=dtype))
+
+    def __len__(self): return self.used - len(self.free)
+
+    def grow(self):
+        self.capacity *= 2; self.sprites.extend([None] * (self.capacity - len(self.sprites)))
+        for name in ['active'] + [name for name, _ in self.FIELDS]:
+            old = getattr(self, name); new = numpy.zeros(self.capacity, dtype=old.dtype)
+            new[:len(old)] = old; setattr(self, name, new)
+
+    def allocate(self, sprite):
+        if self.free: row = self.free.pop()
+        else:
+            if self.used == self.capacity: self.grow()
+            row = self.used; self.used += 1
+        self.active[row] = True; self.sprites[row] = sprite
+        return row
+
+    def release(self, row):
+        self.active[row] = False; self.sprites[row] = None; self.free.append(row)
+
+    def reserve(self, used, rows):
+        # 读档用：之后的 allocate 按顺序发出 rows 里的行；全部发完后由调用方换回存档时的空闲表
+        while self.capacity < used: self.grow()
+        self.used = used; self.free = list(reversed(rows))
+
+class StoreField:
+    # 精灵在仓库里占有一行时读写数组，否则读写实例上的同名私有字段
+    def __set_name__(self, owner, name): self.name = name; self.local = '_' + name
+
+    def __get__(self, sprite, owner=None):
+        if sprite is None: return self
+        if sprite.row is None: return getattr(sprite, self.local)
+        return getattr(sprite.store, self.name)[sprite.row].item()
+
+    def __set__(self, sprite, value):
+        if sprite.row is None: setattr(sprite, self.local, value)
+        else: getattr(sprite.store, self.name)[sprite.row] = value
+
+class EnemyStore(ArrayStore):
+    FIELDS = (('x', numpy.float64), ('y', numpy.float64), ('size', numpy.int64),
+              ('speed', numpy.float64), ('health', numpy.float64), ('damage', numpy.float64))
+
+    def step(self, target, flow=None, near=None, stride=1, tick=0):
+        # 所有敌人朝玩家走一步，一次批量完成；流场需要绕路的格子改按流场方向走
+        # 每步和精灵路径的 Rect.move_ip 一样向零截断，两种模式下敌人速度一致。
+        # LOD：near 以外的敌人按行号分成 stride 片轮流，轮到的一片走 stride 个截断后的单步，其余原地不动。
+        # 整列一起算再乘系数，比挑出轮到的行单独算更快
+        # 先归一化再乘速度，和 Vector2.normalize_ip 的算法一致，否则 1.9999… 会被截成 1
+        n = self.used; x = self.x[:n]; y = self.y[:n]; dx = target[0] - x; dy = target[1] - y; dist = numpy.sqrt(dx * dx + dy * dy)
+        speed = self.speed[:n]; moving = self.active[:n] & (dist > 0)
+        step_x = numpy.divide(dx, dist, out=numpy.zeros(n), where=moving) * speed; step_y = numpy.divide(dy, dist, out=numpy.zeros(n), where=moving) * speed
+        if flow is not None and flow.routing:
+            flow_x, flow_y, routed = flow.lookup(x, y); routed &= self.active[:n]
+            step_x[routed] = flow_x[routed] * speed[routed]; step_y[routed] = flow_y[routed] * speed[routed]
+        numpy.trunc(step_x, out=step_x); numpy.trunc(step_y, out=step_y)
+        if stride > 1:
+            far = (x < near.left) | (x >= near.right) | (y < near.top) | (y >= near.bottom)
+            factor = numpy.where(far, numpy.where((numpy.arange(n) + tick) % stride == 0, stride, 0), 1); step_x *= factor; step_y *= factor
+        x += step_x; y += step_y
+
+    def rows_beyond(self, target, radius):
+        n = self.used; dx = self.x[:n] - target[0]; dy = self.y[:n] - target[1]
+        return numpy.flatnonzero(self.active[:n] & (dx * dx + dy * dy > radius * radius))
+
+    def cell_spans(self, cell_size, rect=None):
+        # 给了 rect 时只交出与它相交的敌人
+        rows = numpy.flatnonzero(self.active[:self.used]); size = self.size[rows]
+        left = self.x[rows].astype(numpy.int64) - size // 2; top = self.y[rows].astype(numpy.int64) - size // 2
+        if rect is not None:
+            inside = (left + size > rect.left) & (left < rect.right) & (top + size > rect.top) & (top < rect.bottom)
+            rows = rows[inside]; size = size[inside]; left = left[inside]; top = top[inside]
+        sprites = [self.sprites[row] for row in rows.tolist()]
+        return sprites, left // cell_size, (left + size - 1) // cell_size, top // cell_size, (top + size - 1) // cell_size
+
+class GemStore(ArrayStore):
+    FIELDS = (('x', numpy.float64), ('y', numpy.float64), ('xp_value', numpy.int64))
+
+    def pull(self, target, radius, speed=8):
+        # 磁铁范围内的宝石一次性朝玩家移动，返回移动过的行
+        n = self.used; dx = target[0] - self.x[:n]; dy = target[1] - self.y[:n]; dist = numpy.hypot(dx, dy)
+        rows = numpy.flatnonzero(self.active[:n] & (dist < radius) & (dist > 0)); scale = speed / dist[rows]
+        self.x[rows] += dx[rows] * scale; self.y[rows] += dy[rows] * scale
+        return rows
+
+    def rows_outside(self, rect):
+        n = self.used; x = self.x[:n]; y = self.y[:n]
+        return numpy.flatnonzero(self.active[:n] & ((x < rect.left) | (x >= rect.right) | (y < rect.top) | (y >= rect.bottom)))
+
+    def cluster(self, rows, cell_size):
+        # 同一格子里的宝石合并到格内第一颗上，经验值按整数精确累加；返回 (吸收了别人的行, 被吸收的行)
+        if len(rows) < 2: return rows[:0], rows[:0]
+        cells = numpy.stack([numpy.floor_divide(self.x[rows], cell_size), numpy.floor_divide(self.y[rows], cell_size)], axis=1)
+        _, first, inverse, counts = numpy.unique(cells, axis=0, return_index=True, return_inverse=True, return_counts=True)
+        totals = numpy.zeros(len(first), dtype=numpy.int64); numpy.add.at(totals, inverse.ravel(), self.xp_value[rows])
+        keep = rows[first]; self.xp_value[keep] = totals
+        return keep[counts > 1], numpy.setdiff1d(rows, keep)
+
+class ParticleStore(ArrayStore):
+    # 子弹和斧头的位置、速度、重力、伤害、穿透和寿命都放在数组里，每 tick 一次积分完成
+    FIELDS = (('x', numpy.float64), ('y', numpy.float64), ('vx', numpy.float64), ('vy', numpy.float64),
+              ('gravity', numpy.float64), ('angle', numpy.float64), ('spin', numpy.float64), ('half', numpy.float64),
+              ('damage', numpy.float64), ('pierce', numpy.int64), ('hits', numpy.int64), ('lifetime', numpy.int64))
+
+    def launch(self, row, pos, velocity, half, gravity=0.0, spin=0.0, pierce=1):
+        self.x[row], self.y[row] = pos; self.vx[row], self.vy[row] = velocity; self.half[row] = half
+        self.gravity[row] = gravity; self.angle[row] = 0; self.spin[row] = spin
+        self.pierce[row] = pierce; self.hits[row] = 0; self.lifetime[row] = PARTICLE_LIFETIME_TICKS
+
+    def step(self):
+        n = self.used
+        self.vy[:n] += self.gravity[:n]; self.x[:n] += self.vx[:n]; self.y[:n] += self.vy[:n]
+        self.angle[:n] = (self.angle[:n] + self.spin[:n]) % 360; self.lifetime[:n] -= 1
+
+    def extents(self, rows):
+        # 旋转后外接框的半宽
+        rad = numpy.radians(self.angle[rows])
+        return self.half[rows] * (numpy.abs(numpy.cos(rad)) + numpy.abs(numpy.sin(rad)))
+
+    def rows_expired(self, rect):
+        # 一次向量化测试找出飞出 rect 或寿命耗尽的行
+        rows = numpy.flatnonzero(self.active[:self.used]); x = self.x[rows]; y = self.y[rows]; extent = self.extents(rows)
+        gone = (self.lifetime[rows] <= 0) | (x + extent < rect.left) | (x - extent >= rect.right) | (y + extent < rect.top) | (y - extent >= rect.bottom)
+        return rows[gone]
+
+    def hit_candidates(self, grid):
+        # 宽相位批量完成：算出每个飞行物覆盖的格子，只把格子里有东西的飞行物连同候选一起交出去
+        rows = numpy.flatnonzero(self.active[:self.used])
+        if not len(rows) or not grid.cells: return []
+        x = self.x[rows]; y = self.y[rows]; extent = self.extents(rows); size = grid.cell_size
+        left = numpy.floor(x - extent).astype(numpy.int64) // size; right = numpy.floor(x + extent).astype(numpy.int64) // size
+        top = numpy.floor(y - extent).astype(numpy.int64) // size; bottom = numpy.floor(y + extent).astype(numpy.int64) // size
+        cells = grid.cells; sprites = self.sprites; candidates = []
+        for row, x0, x1, y0, y1 in zip(rows.tolist(), left.tolist(), right.tolist(), top.tolist(), bottom.tolist()):
+            found = [sprite for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) for sprite in cells.get((cx, cy), ())]
+            if found: candidates.append((sprites[row], found))
+        return candidates
+
 # --- 伤害数字类 ---
-class DamageNumber(pygame.sprite.Sprite):
-    def __init__(self, value, pos, font):
-        super().__init__()
-        self.image = font.render(str(int(value)), True, WHITE)
+class DamageNumber(PooledSprite):
+    def reset(self, game, value, pos, font):
+        self.game = game; self.value = int(value); self.font = font
+        self.image = game.text_cache.number(font, self.value, WHITE)
         self.rect = self.image.get_rect(center=pos)
-        self.spawn_time = pygame.time.get_ticks()
+        self.spawn_time = game.sim_clock.now
         self.duration = 600; self.speed_y = -2
 
     def update(self):
         self.rect.y += self.speed_y
-        alpha = 255 * (1 - (pygame.time.get_ticks() - self.spawn_time) / self.duration)
+        alpha = 255 * (1 - (self.game.sim_clock.now - self.spawn_time) / self.duration)
         if alpha <= 0: self.kill()
-        else: self.image.set_alpha(alpha)
+        else: self.image = self.game.text_cache.number(self.font, self.value, WHITE, alpha)
 
 # --- 玩家类 ---
 class Player(pygame.sprite.Sprite):
-    def __init__(self, game, config):
+    def __init__(self, game):
         super().__init__()
         self.game = game
-        self.image = pygame.Surface([PLAYER_SIZE, PLAYER_SIZE], pygame.SRCALPHA)
-        pygame.draw.rect(self.image, BLUE, (5, 15, PLAYER_SIZE - 10, PLAYER_SIZE - 15))
-        pygame.draw.circle(self.image, WHITE, (PLAYER_SIZE // 2, 10), 8)
+        self.image = sprite_cache.get('player', self.create_image)
         self.rect = self.image.get_rect(center=(WORLD_SIZE[0] // 2, WORLD_SIZE[1] // 2))
         
-        self.speed = config['player_stats']['speed']
-        self.max_health = config['player_stats']['health']
-        self.health = self.max_health
+        self.upgrades = {}; self.items = {}
+        self.refresh_stats(); self.health = self.max_health
         self.level = 1; self.experience = 0; self.experience_to_next_level = 10
         self.last_move_dir = pygame.math.Vector2(0, -1)
-        self.magnet_radius = 0; self.damage_multiplier = 1.0; self.area_multiplier = 1.0
         self.invincible = False
 
-        self.upgrades = {key: 0 for key in game.config['passive_data']}
-        self.items = {}
+    def refresh_stats(self):
+        # 属性全部由基础值 + 被动等级算出，升级和热重载都走这里
+        stats = self.game.stats
+        for key in stats.passives: self.upgrades.setdefault(key, 0)
+        def bonus(key): return stats.passives[key].effect * self.upgrades[key] if key in stats.passives else 0
+        self.speed = stats.settings.player_speed + bonus('speed'); self.max_health = stats.settings.player_health + bonus('max_health')
+        self.magnet_radius = bonus('magnet'); self.damage_multiplier = 1.0 + bonus('spinach'); self.area_multiplier = 1.0 + bonus('candelabrador')
+
+    @staticmethod
+    def create_image():
+        image = pygame.Surface([PLAYER_SIZE, PLAYER_SIZE], pygame.SRCALPHA)
+        pygame.draw.rect(image, BLUE, (5, 15, PLAYER_SIZE - 10, PLAYER_SIZE - 15))
+        pygame.draw.circle(image, WHITE, (PLAYER_SIZE // 2, 10), 8)
+        return image
 
     def take_damage(self, amount):
         if self.invincible: return
         self.health -= amount
-        self.game.sounds['player_hit'].play()
+        self.game.audio.play('player_hit')
         if self.health <= 0:
             self.health = 0; self.game.game_over = True
 
@@ -100,7 +965,7 @@ class Player(pygame.sprite.Sprite):
 
     def gain_experience(self, amount):
         self.experience += amount
-        self.game.sounds['gem_pickup'].play()
+        self.game.audio.play('gem_pickup')
         while self.experience >= self.experience_to_next_level:
             self.level_up()
     
@@ -112,15 +977,15 @@ class Player(pygame.sprite.Sprite):
         self.experience -= self.experience_to_next_level
         self.experience_to_next_level = int(self.experience_to_next_level * 1.5)
         self.game.prepare_level_up_choices()
-        self.game.sounds['level_up'].play()
+        self.game.audio.play('level_up')
 
     def update(self):
         move_dir = pygame.math.Vector2(0, 0)
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]: move_dir.x = -1
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: move_dir.x = 1
-        if keys[pygame.K_UP] or keys[pygame.K_w]: move_dir.y = -1
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]: move_dir.y = 1
+        mask = self.game.read_movement()
+        if mask & MOVE_LEFT: move_dir.x = -1
+        if mask & MOVE_RIGHT: move_dir.x = 1
+        if mask & MOVE_UP: move_dir.y = -1
+        if mask & MOVE_DOWN: move_dir.y = 1
 
         if move_dir.length_squared() > 0:
             move_dir.normalize_ip()
@@ -132,71 +997,121 @@ class Player(pygame.sprite.Sprite):
 
 # --- 敌人基类 ---
 class Enemy(pygame.sprite.Sprite):
+    size = ENEMY_SIZE
+    health = StoreField(); speed = StoreField(); damage = StoreField()
+
     def __init__(self, player, stats):
         super().__init__(); self.player = player
-        self.health = stats['health']; self.speed = stats['speed']
-        self.damage = stats['damage']; self.xp_value = stats['xp']
-        self.image = pygame.Surface([ENEMY_SIZE, ENEMY_SIZE], pygame.SRCALPHA)
-        pygame.draw.circle(self.image, RED, (ENEMY_SIZE // 2, ENEMY_SIZE // 2), ENEMY_SIZE // 2)
-        pygame.draw.circle(self.image, BLACK, (ENEMY_SIZE // 2 - 5, ENEMY_SIZE // 2 - 5), 3)
-        pygame.draw.circle(self.image, BLACK, (ENEMY_SIZE // 2 + 5, ENEMY_SIZE // 2 - 5), 3)
-        self.rect = self.image.get_rect(); self.spawn_at_edge()
+        self.store = player.game.enemy_store; self.row = None
+        self.image = sprite_cache.get(type(self), self.create_image); self._rect = self.image.get_rect()
+        if self.store is not None:
+            self.row = self.store.allocate(self); self.store.size[self.row] = self.size
+        self.health = stats.health; self.speed = stats.speed
+        self.damage = stats.damage; self.xp_value = stats.xp
+        self.spawn_at_edge()
+
+    def create_image(self):
+        image = pygame.Surface([ENEMY_SIZE, ENEMY_SIZE], pygame.SRCALPHA)
+        pygame.draw.circle(image, RED, (ENEMY_SIZE // 2, ENEMY_SIZE // 2), ENEMY_SIZE // 2)
+        pygame.draw.circle(image, BLACK, (ENEMY_SIZE // 2 - 5, ENEMY_SIZE // 2 - 5), 3)
+        pygame.draw.circle(image, BLACK, (ENEMY_SIZE // 2 + 5, ENEMY_SIZE // 2 - 5), 3)
+        return image
+
+    @property
+    def rect(self):
+        if self.row is None: return self._rect
+        half = self.size // 2
+        return pygame.Rect(int(self.store.x[self.row]) - half, int(self.store.y[self.row]) - half, self.size, self.size)
+
+    @rect.setter
+    def rect(self, rect):
+        self._rect = rect
+        if self.row is not None: self.place(*rect.center)
+
+    def place(self, x, y):
+        # 仓库里也存 Rect 取整后的中心，与精灵路径从同一个整数位置出发
+        self._rect.center = (x, y)
+        if self.row is not None: self.store.x[self.row], self.store.y[self.row] = self._rect.center
 
     def spawn_at_edge(self):
-        spawn_dist = max(SCREEN_WIDTH, SCREEN_HEIGHT) / 2 + 50
-        angle = random.uniform(0, 2 * math.pi)
-        self.rect.centerx = self.player.rect.centerx + spawn_dist * math.cos(angle)
-        self.rect.centery = self.player.rect.centery + spawn_dist * math.sin(angle)
+        angle = self.player.game.rng.uniform(0, 2 * math.pi)
+        self.place(self.player.rect.centerx + SPAWN_RING_RADIUS * math.cos(angle), self.player.rect.centery + SPAWN_RING_RADIUS * math.sin(angle))
+
+    def kill(self):
+        # 死亡后交还仓库行，把最后的数值留在实例上，供掉落和结算继续读取
+        if self.row is not None:
+            rect, health, speed, damage = self.rect, self.health, self.speed, self.damage
+            self.store.release(self.row); self.row = None
+            self._rect = rect; self.health = health; self.speed = speed; self.damage = damage
+        super().kill()
 
     def take_damage(self, amount):
-        self.health -= amount
-        self.game.sounds['enemy_hit'].play()
-        self.game.add_sprite(DamageNumber(amount, self.rect.center, self.game.small_font))
+        self.health -= amount; game = self.game; quality = game.quality
+        if quality.hit_sounds: game.audio.play('enemy_hit')
+        if game.show_damage_numbers and quality.damage_number_every and next(game.damage_number_ids) % quality.damage_number_every == 0:
+            game.add_sprite(game.damage_number_pool.acquire(game, amount, self.rect.center, game.small_font), game.damage_numbers)
         if self.health <= 0:
             self.kill(); return True
         return False
 
     def update(self):
-        direction = pygame.math.Vector2(self.player.rect.center) - self.rect.center
+        if self.row is not None: return  # 由 EnemyStore.step 批量移动
+        game = self.player.game; stride = game.lod_stride
+        if stride > 1 and not game.near_view.collidepoint(self.rect.center):
+            if (self.uid + game.sim_clock.ticks) % stride: return  # 远处的敌人按 uid 轮流，每 stride 个 tick 走一次
+        else: stride = 1
+        direction = game.flow_field.direction(*self.rect.center)
+        if direction is None: direction = pygame.math.Vector2(self.player.rect.center) - self.rect.center
         if direction.length_squared() > 0:
-            direction.normalize_ip(); self.rect.move_ip(direction * self.speed)
+            # 逐步截断（同 move_ip），再乘 stride，远处分片走的路程和每 tick 都走时一样
+            direction.normalize_ip(); step = direction * self.speed; self.rect.move_ip(int(step.x) * stride, int(step.y) * stride)
 
 class TankEnemy(Enemy):
-    def __init__(self, player, stats):
-        super().__init__(player, stats)
-        self.image = pygame.Surface([TANK_ENEMY_SIZE, TANK_ENEMY_SIZE], pygame.SRCALPHA)
-        pygame.draw.rect(self.image, PURPLE, (0, 0, TANK_ENEMY_SIZE, TANK_ENEMY_SIZE), border_radius=8)
-        pygame.draw.rect(self.image, BLACK, (10, 10, 10, 10))
-        self.rect = self.image.get_rect(); self.spawn_at_edge()
+    size = TANK_ENEMY_SIZE
+
+    def create_image(self):
+        image = pygame.Surface([TANK_ENEMY_SIZE, TANK_ENEMY_SIZE], pygame.SRCALPHA)
+        pygame.draw.rect(image, PURPLE, (0, 0, TANK_ENEMY_SIZE, TANK_ENEMY_SIZE), border_radius=8)
+        pygame.draw.rect(image, BLACK, (10, 10, 10, 10))
+        return image
 
 class BossEnemy(Enemy):
-    def __init__(self, player, stats):
-        super().__init__(player, stats)
-        self.image = pygame.Surface([BOSS_ENEMY_SIZE, BOSS_ENEMY_SIZE], pygame.SRCALPHA)
-        pygame.draw.circle(self.image, ORANGE, (BOSS_ENEMY_SIZE // 2, BOSS_ENEMY_SIZE // 2), BOSS_ENEMY_SIZE // 2)
-        pygame.draw.polygon(self.image, BLACK, [(30, 30), (40, 20), (50, 30)])
-        pygame.draw.polygon(self.image, BLACK, [(BOSS_ENEMY_SIZE - 30, 30), (BOSS_ENEMY_SIZE - 40, 20), (BOSS_ENEMY_SIZE - 50, 30)])
-        self.rect = self.image.get_rect(); self.spawn_at_edge()
+    size = BOSS_ENEMY_SIZE
+
+    def create_image(self):
+        image = pygame.Surface([BOSS_ENEMY_SIZE, BOSS_ENEMY_SIZE], pygame.SRCALPHA)
+        pygame.draw.circle(image, ORANGE, (BOSS_ENEMY_SIZE // 2, BOSS_ENEMY_SIZE // 2), BOSS_ENEMY_SIZE // 2)
+        pygame.draw.polygon(image, BLACK, [(30, 30), (40, 20), (50, 30)])
+        pygame.draw.polygon(image, BLACK, [(BOSS_ENEMY_SIZE - 30, 30), (BOSS_ENEMY_SIZE - 40, 20), (BOSS_ENEMY_SIZE - 50, 30)])
+        return image
 
 # --- 武器类 ---
 class Weapon(pygame.sprite.Sprite):
     def __init__(self, player, game):
         super().__init__(); self.player = player; self.game = game
-        self.name = "Unnamed"; self.image = pygame.Surface([1, 1], pygame.SRCALPHA)
+        self.name = "Unnamed"; self.image = sprite_cache.get('weapon', lambda: pygame.Surface([1, 1], pygame.SRCALPHA))
         self.rect = self.image.get_rect(center=player.rect.center); self.icon = pygame.Surface([40, 40], pygame.SRCALPHA)
         self.upgrade_options = {}
 
+    def refresh_stats(self): pass
+
 class OrbitWeapon(Weapon):
     def __init__(self, player, game):
         super().__init__(player, game); self.name = "orbit_weapon"
-        self.data = game.config['weapon_data'][self.name]
-        self.damage = self.data['damage']; self.orbiters = pygame.sprite.Group()
-        self.orbiter_count = 0; self.orbiter_speed = self.data['base_speed']
-        self.orbiter_radius = self.data['base_radius']; self.orbiter_size = self.data['base_size']
-        self.count_level = 0; self.speed_level = 0; self.size_level = 0; self.angle = 0
-        self.upgrade_options = {key: (value['text'], value['max_level']) for key, value in self.data['upgrades'].items()}
+        self.data = game.stats.weapons[self.name]; self.orbiters = pygame.sprite.Group()
+        self.orbiter_count = 0; self.count_level = 0; self.speed_level = 0; self.size_level = 0; self.angle = 0
+        self.refresh_stats()
         self.icon.fill(GREEN); pygame.draw.circle(self.icon, WHITE, (20, 20), 15, 3)
 
+    def refresh_stats(self):
+        self.data = data = self.game.stats.weapons[self.data.key]
+        def bonus(key): return data.upgrades[key].effect * getattr(self, f"{key}_level") if key in data.upgrades else 0
+        self.damage = data.damage; self.orbiter_speed = data.base_speed + bonus('speed')
+        self.orbiter_radius = data.base_radius; self.orbiter_size = data.base_size + bonus('size')
+        self.upgrade_options = {key: (upgrade.text, upgrade.max_level) for key, upgrade in data.upgrades.items()}
+        for orbiter in self.orbiters: orbiter.damage = self.damage
+        self.update_orbiter_visuals()
+
     @property
     def level(self): return self.count_level + self.speed_level + self.size_level
 
@@ -227,154 +1142,600 @@ class OrbitingObject(pygame.sprite.Sprite):
 
     def update_visuals(self):
         size = int(self.parent.orbiter_size * self.player.area_multiplier)
-        self.image = pygame.Surface([size, size], pygame.SRCALPHA)
-        pygame.draw.circle(self.image, GREEN, (size // 2, size // 2), size // 2)
+        self.image = sprite_cache.get(('orbiter', size), lambda: self.create_image(size))
         self.rect = self.image.get_rect()
 
+    @staticmethod
+    def create_image(size):
+        image = pygame.Surface([size, size], pygame.SRCALPHA)
+        pygame.draw.circle(image, GREEN, (size // 2, size // 2), size // 2)
+        return image
+
     def update(self):
         total_angle = self.parent.angle + self.base_angle
         rad_angle = math.radians(total_angle)
         self.rect.center = self.player.rect.center + pygame.math.Vector2(self.parent.orbiter_radius, 0).rotate_rad(rad_angle)
 
 class ProjectileWeapon(Weapon):
+    cooldown_scale = 1.0; upgradable = True
+
     def __init__(self, player, game):
         super().__init__(player, game); self.name = "projectile_weapon"
-        self.data = game.config['weapon_data'][self.name]
-        self.cooldown = self.data['base_cooldown']
-        self.level = 0; self.last_shot_time = pygame.time.get_ticks()
+        self.data = game.stats.weapons[self.name]
+        self.level = 0; self.last_shot_time = game.sim_clock.now
         pygame.draw.circle(self.icon, CYAN, (20, 20), 15)
-        self.upgrade_options = {"cooldown": (self.data['name'] + ": -Cooldown", self.data['max_level'])}
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        self.data = self.game.stats.weapons[self.data.key]; self.cooldown = self.data.cooldown_at(self.level, self.cooldown_scale)
+        self.upgrade_options = {"cooldown": (self.data.name + ": -Cooldown", self.data.max_level)} if self.upgradable else {}
 
     def update(self):
-        self.rect.center = self.player.rect.center; now = pygame.time.get_ticks()
+        self.rect.center = self.player.rect.center; now = self.game.sim_clock.now
         if now - self.last_shot_time > self.cooldown: self.shoot(); self.last_shot_time = now
 
+    def find_nearest_enemies(self, k):
+        return self.game.enemy_grid.nearest(self.player.rect.center, k)
+
     def find_nearest_enemy(self):
-        return min(self.game.enemies, key=lambda e: pygame.math.Vector2(e.rect.center).distance_squared_to(self.player.rect.center), default=None)
+        nearest = self.find_nearest_enemies(1)
+        return nearest[0] if nearest else None
 
     def shoot(self):
         target = self.find_nearest_enemy()
         if target:
-            self.game.sounds['shoot'].play()
-            self.game.add_sprite(Projectile(self.game, self.rect.center, target.rect.center, self.player.damage_multiplier, self.data), self.game.projectiles)
+            self.game.audio.play('shoot')
+            self.game.add_sprite(self.game.projectile_pool.acquire(self.game, self.rect.center, target.rect.center, self.player.damage_multiplier, self.data), self.game.projectiles)
 
 class SuperProjectileWeapon(ProjectileWeapon):
+    cooldown_scale = 0.5; upgradable = False
+
     def __init__(self, player, game):
-        super().__init__(player, game); self.name = "super_projectile_weapon"; self.cooldown *= 0.5
+        super().__init__(player, game); self.name = "super_projectile_weapon"
         self.icon.fill(GOLD); pygame.draw.circle(self.icon, CYAN, (20, 20), 15)
-        self.upgrade_options = {}
 
     def shoot(self):
         target = self.find_nearest_enemy()
         if target:
-            self.game.sounds['shoot'].play(); direction = pygame.math.Vector2(target.rect.center) - self.rect.center
+            self.game.audio.play('shoot'); direction = pygame.math.Vector2(target.rect.center) - self.rect.center
             for angle in [-20, 0, 20]:
                 rotated_dir = direction.rotate(angle); target_pos = self.rect.center + rotated_dir
-                self.game.add_sprite(Projectile(self.game, self.rect.center, target_pos, self.player.damage_multiplier, self.data), self.game.projectiles)
-
-class Projectile(pygame.sprite.Sprite):
-    def __init__(self, game, start_pos, target_pos, damage_multiplier, data):
-        super().__init__(); self.game = game
-        size = data['size']
-        self.image = pygame.Surface([size, size], pygame.SRCALPHA)
-        pygame.draw.circle(self.image, CYAN, (size // 2, size // 2), size // 2)
-        self.rect = self.image.get_rect(center=start_pos); self.damage = data['damage'] * damage_multiplier
+                self.game.add_sprite(self.game.projectile_pool.acquire(self.game, self.rect.center, target_pos, self.player.damage_multiplier, self.data), self.game.projectiles)
+
+class Particle(PooledSprite):
+    # 飞行物精灵只负责贴图，运动、剔除和命中候选都由 ParticleStore 批量处理
+    damage = StoreField(); pierce = StoreField(); hits = StoreField(); row = None
+    consumed_on_hit = False  # 打满穿透次数后是否立即消失
+
+    def attach(self, game):
+        self.game = game; self.store = game.particles; self.row = self.store.allocate(self)
+
+    @property
+    def center(self):
+        if self.row is None: return self._center
+        return int(self.store.x[self.row]), int(self.store.y[self.row])
+
+    @property
+    def rect(self): return self.image.get_rect(center=self.center)
+
+    def kill(self):
+        if self.row is not None:
+            center, damage, pierce, hits = self.center, self.damage, self.pierce, self.hits
+            self.store.release(self.row); self.row = None
+            self._center = center; self.damage = damage; self.pierce = pierce; self.hits = hits
+        super().kill()
+
+class Projectile(Particle):
+    consumed_on_hit = True
+
+    def reset(self, game, start_pos, target_pos, damage_multiplier, data):
+        self.attach(game)
+        size = data.size
+        self.image = sprite_cache.get(('projectile', size), lambda: self.create_image(size))
         direction = pygame.math.Vector2(target_pos) - start_pos
-        speed = self.game.config['game_settings']['projectile_speed']
-        if direction.length_squared() > 0: self.velocity = direction.normalize() * speed
-        else: self.velocity = pygame.math.Vector2(0, -speed)
+        speed = self.game.stats.settings.projectile_speed
+        velocity = direction.normalize() * speed if direction.length_squared() > 0 else pygame.math.Vector2(0, -speed)
+        self.store.launch(self.row, start_pos, velocity, size / 2); self.damage = data.damage * damage_multiplier
 
-    def update(self):
-        self.rect.move_ip(self.velocity)
-        if not self.game.camera.get_view_rect().inflate(200, 200).colliderect(self.rect): self.kill()
+    @staticmethod
+    def create_image(size):
+        image = pygame.Surface([size, size], pygame.SRCALPHA)
+        pygame.draw.circle(image, CYAN, (size // 2, size // 2), size // 2)
+        return image
 
 class AxeWeapon(Weapon):
+    fixed_cooldown = None
+
     def __init__(self, player, game):
         super().__init__(player, game); self.name = "axe_weapon"
-        self.data = game.config['weapon_data'][self.name]
-        self.cooldown = self.data['base_cooldown']
-        self.level = 0; self.last_shot_time = pygame.time.get_ticks()
+        self.data = game.stats.weapons[self.name]
+        self.level = 0; self.last_shot_time = game.sim_clock.now
         pygame.draw.rect(self.icon, GREY, (18, 5, 4, 30)); pygame.draw.rect(self.icon, LIGHT_BLUE, (5, 10, 30, 20))
-        self.upgrade_options = {"cooldown": (self.data['name'] + ": -Cooldown", self.data['max_level'])}
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        self.data = self.game.stats.weapons[self.data.key]; self.cooldown = self.fixed_cooldown or self.data.cooldown_at(self.level)
+        self.upgrade_options = {"cooldown": (self.data.name + ": -Cooldown", self.data.max_level)} if self.fixed_cooldown is None else {}
 
     def update(self):
-        self.rect.center = self.player.rect.center; now = pygame.time.get_ticks()
+        self.rect.center = self.player.rect.center; now = self.game.sim_clock.now
         if now - self.last_shot_time > self.cooldown: self.shoot(); self.last_shot_time = now
     
     def shoot(self):
-        self.game.sounds['shoot'].play()
-        self.game.add_sprite(Axe(self.game, self.rect.center, self.player.damage_multiplier, self.data), self.game.axes)
+        self.game.audio.play('shoot')
+        self.game.add_sprite(self.game.axe_pool.acquire(self.game, self.rect.center, self.player.damage_multiplier, self.data), self.game.axes)
 
 class DeathSpiralWeapon(AxeWeapon):
+    fixed_cooldown = 2000
+
     def __init__(self, player, game):
-        super().__init__(player, game); self.name = "death_spiral"; self.cooldown = 2000
+        super().__init__(player, game); self.name = "death_spiral"
         self.icon.fill(RED); pygame.draw.rect(self.icon, GREY, (18, 5, 4, 30)); pygame.draw.rect(self.icon, LIGHT_BLUE, (5, 10, 30, 20))
-        self.upgrade_options = {}
     
     def shoot(self):
-        self.game.sounds['shoot'].play()
+        self.game.audio.play('shoot')
         for i in range(8):
             angle = i * (360 / 8)
             direction = pygame.math.Vector2(1, 0).rotate(angle)
-            self.game.add_sprite(Axe(self.game, self.rect.center, self.player.damage_multiplier, self.data, initial_velocity=direction * 5), self.game.axes)
-
-class Axe(pygame.sprite.Sprite):
-    def __init__(self, game, start_pos, damage_multiplier, data, initial_velocity=None):
-        super().__init__(); self.game = game
-        size = data['size']
-        self.original_image = pygame.Surface([size, size], pygame.SRCALPHA)
-        pygame.draw.rect(self.original_image, GREY, (size*0.4, 0, size*0.2, size)); pygame.draw.rect(self.original_image, LIGHT_BLUE, (0, size*0.2, size, size*0.6))
-        self.image = self.original_image; self.rect = self.image.get_rect(center=start_pos)
-        self.damage = data['damage'] * damage_multiplier; self.pos = pygame.math.Vector2(start_pos)
-        if initial_velocity: self.velocity = initial_velocity
-        else: self.velocity = pygame.math.Vector2(random.choice([-1, 1]) * 4, -12)
-        self.gravity = 0.5; self.angle = 0; self.rot_speed = 10 * random.choice([-1, 1])
-        self.pierce = data['pierce']; self.hit_enemies = set()
+            self.game.add_sprite(self.game.axe_pool.acquire(self.game, self.rect.center, self.player.damage_multiplier, self.data, direction * 5), self.game.axes)
+
+class Axe(Particle):
+    def reset(self, game, start_pos, damage_multiplier, data, initial_velocity=None):
+        self.attach(game)
+        size = data.size
+        self.frames = sprite_cache.rotations(('axe', size), lambda: self.create_image(size), AXE_ROTATION_STEP)
+        velocity = initial_velocity if initial_velocity else (game.rng.choice([-1, 1]) * 4, -12)
+        self.store.launch(self.row, start_pos, velocity, size / 2, gravity=0.5, spin=10 * game.rng.choice([-1, 1]), pierce=data.pierce)
+        self.damage = data.damage * damage_multiplier; self._angle = 0
+
+    @property
+    def image(self):
+        angle = self.store.angle[self.row] if self.row is not None else self._angle
+        return self.frames[round(angle / AXE_ROTATION_STEP) % len(self.frames)]
+
+    def kill(self):
+        if self.row is not None: self._angle = self.store.angle[self.row]
+        super().kill()
+
+    @staticmethod
+    def create_image(size):
+        image = pygame.Surface([size, size], pygame.SRCALPHA)
+        pygame.draw.rect(image, GREY, (size*0.4, 0, size*0.2, size)); pygame.draw.rect(image, LIGHT_BLUE, (0, size*0.2, size, size*0.6))
+        return image
 
-    def update(self):
-        self.velocity.y += self.gravity; self.pos += self.velocity; self.rect.center = self.pos
-        self.angle = (self.angle + self.rot_speed) % 360
-        self.image = pygame.transform.rotate(self.original_image, self.angle)
-        self.rect = self.image.get_rect(center=self.rect.center)
-        if not self.game.camera.get_view_rect().inflate(200, 200).colliderect(self.rect): self.kill()
 
 # --- 掉落物类 ---
-class ExperienceGem(pygame.sprite.Sprite):
-    def __init__(self, pos, value):
-        super().__init__(); self.image = pygame.Surface([XP_GEM_SIZE, XP_GEM_SIZE], pygame.SRCALPHA)
+class ExperienceGem(PooledSprite):
+    xp_value = StoreField(); row = None
+
+    def reset(self, game, pos, value):
+        self.game = game; self.store = game.gem_store; self.row = self.store.allocate(self)
+        self.image = sprite_cache.get('gem', self.create_image); self.merged = False
+        self.place(*pos); self.xp_value = value
+
+    @staticmethod
+    def create_image(color=YELLOW):
+        image = pygame.Surface([XP_GEM_SIZE, XP_GEM_SIZE], pygame.SRCALPHA)
         points = [(XP_GEM_SIZE // 2, 0), (XP_GEM_SIZE, XP_GEM_SIZE // 2), (XP_GEM_SIZE // 2, XP_GEM_SIZE), (0, XP_GEM_SIZE // 2)]
-        pygame.draw.polygon(self.image, YELLOW, points); self.rect = self.image.get_rect(center=pos); self.xp_value = value
+        pygame.draw.polygon(image, color, points)
+        return image
 
-    def update(self):
-        if self.game.player.magnet_radius > 0:
-            player_pos = pygame.math.Vector2(self.game.player.rect.center); gem_pos = pygame.math.Vector2(self.rect.center)
-            dist = player_pos.distance_to(gem_pos)
-            if dist < self.game.player.magnet_radius:
-                direction = (player_pos - gem_pos).normalize(); self.rect.move_ip(direction * 8)
+    @property
+    def rect(self):
+        if self.row is None: return self._rect
+        half = XP_GEM_SIZE // 2
+        return pygame.Rect(int(self.store.x[self.row]) - half, int(self.store.y[self.row]) - half, XP_GEM_SIZE, XP_GEM_SIZE)
+
+    def place(self, x, y): self.store.x[self.row] = x; self.store.y[self.row] = y
+
+    def mark_merged(self): self.image = sprite_cache.get('gem_merged', lambda: self.create_image(LIGHT_BLUE)); self.merged = True
+
+    def kill(self):
+        if self.row is not None:
+            rect, xp_value = self.rect, self.xp_value
+            self.store.release(self.row); self.row = None
+            self._rect = rect; self.xp_value = xp_value; self.game.gem_grid.remove(self)
+        super().kill()
 
 class TreasureChest(pygame.sprite.Sprite):
     def __init__(self, pos):
-        super().__init__(); self.image = pygame.Surface([40, 40], pygame.SRCALPHA)
-        pygame.draw.rect(self.image, BROWN, (0, 10, 40, 30)); pygame.draw.rect(self.image, GOLD, (0, 10, 40, 10))
-        pygame.draw.rect(self.image, BLACK, (18, 20, 4, 8)); self.rect = self.image.get_rect(center=pos)
+        super().__init__(); self.image = sprite_cache.get('chest', self.create_image)
+        self.rect = self.image.get_rect(center=pos)
+
+    @staticmethod
+    def create_image():
+        image = pygame.Surface([40, 40], pygame.SRCALPHA)
+        pygame.draw.rect(image, BROWN, (0, 10, 40, 30)); pygame.draw.rect(image, GOLD, (0, 10, 40, 10))
+        pygame.draw.rect(image, BLACK, (18, 20, 4, 8))
+        return image
+
+# --- 配置编译 ---
+# config.json 只在加载时解析、校验一次，编译成不可变的带 slots 的数值对象；
+# 热路径上用属性访问，不再层层查 dict
+class ConfigError(ValueError): pass
+
+# 配置键到实现类的注册表：升级候选、进化配方都从这里查，不再实例化武器取名或翻 globals()
+ENEMY_CLASSES = {'enemy': Enemy, 'tank': TankEnemy, 'boss': BossEnemy}
+BASE_WEAPONS = {'projectile_weapon': ProjectileWeapon, 'axe_weapon': AxeWeapon, 'orbit_weapon': OrbitWeapon}
+EVOLVED_WEAPONS = {'super_projectile_weapon': SuperProjectileWeapon, 'death_spiral': DeathSpiralWeapon}
+CONFIG_RELOAD_SECONDS = 1.0  # 每秒（真实时间）检查一次 config.json 的修改时间；--fast 下也不会更频繁
+ALL_WEAPONS = {**BASE_WEAPONS, **EVOLVED_WEAPONS}
+ENEMY_KINDS = list(ENEMY_CLASSES); PARTICLE_KINDS = [Projectile, Axe]
+# 存档时记录的武器状态字段，只取实例上实际存在的
+WEAPON_STATE = ('level', 'last_shot_time', 'count_level', 'speed_level', 'size_level', 'angle')
+
+@dataclass(frozen=True, slots=True)
+class EnemyStats:
+    health: float; speed: float; damage: float; xp: int
+
+@dataclass(frozen=True, slots=True)
+class OrbitUpgrade:
+    text: str; max_level: int; effect: float
+
+@dataclass(frozen=True, slots=True)
+class WeaponStats:
+    key: str; name: str; damage: float; max_level: int = 0; size: int = 0; pierce: int = 0
+    base_cooldown: float = 0; cooldown_reduction: float = 0
+    base_speed: float = 0; base_radius: float = 0; base_size: int = 0; upgrades: dict = field(default_factory=dict)
+
+    def cooldown_at(self, level, scale=1.0):
+        return self.base_cooldown * scale * (1 - self.cooldown_reduction) ** max(level - 1, 0)
+
+@dataclass(frozen=True, slots=True)
+class PassiveStats:
+    key: str; name: str; max_level: int; effect: float
+
+@dataclass(frozen=True, slots=True)
+class EvolutionRecipe:
+    name: str; base_weapon: str; passive_item: str; weapon_class: type
+
+@dataclass(frozen=True, slots=True)
+class GameSettings:
+    player_speed: float; player_health: float; initial_enemy_spawn_rate: int; projectile_speed: float
+    vectorized_enemies: bool; gem_merge_threshold: int; gem_merge_cell: int
+    max_live_enemies: int; spawn_batch_max: int; despawn_radius: float; lod_stride: int
+
+@dataclass(frozen=True, slots=True)
+class GovernorSettings:
+    enabled: bool; budget_ms: float; window_frames: int; degrade_above: float; recover_below: float; recover_hold_frames: int
+
+@dataclass(frozen=True, slots=True)
+class CompiledConfig:
+    settings: GameSettings; enemies: dict; weapons: dict; passives: dict; evolutions: tuple; governor: GovernorSettings
+
+def config_value(section, key, path, kind=float, default=None):
+    if not isinstance(section, dict): raise ConfigError(f"{path}: 应为对象")
+    if key not in section:
+        if default is None: raise ConfigError(f"{path}.{key}: 缺少字段")
+        return default
+    value = section[key]
+    if kind in (str, dict):
+        if not isinstance(value, kind): raise ConfigError(f"{path}.{key}: 应为{'字符串' if kind is str else '对象'}")
+        return value
+    if kind is bool:
+        if not isinstance(value, bool): raise ConfigError(f"{path}.{key}: 应为 true/false")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)): raise ConfigError(f"{path}.{key}: 应为数值")
+    if kind is int and value != int(value): raise ConfigError(f"{path}.{key}: 应为整数")
+    if value < 0: raise ConfigError(f"{path}.{key}: 不能为负数")
+    return kind(value)
+
+def compile_weapon(key, data):
+    path = f"weapon_data.{key}"
+    name = config_value(data, 'name', path, str); damage = config_value(data, 'damage', path)
+    if 'upgrades' in data:
+        # 环绕类武器：各项升级分开计级
+        upgrades = {}
+        for upgrade_key, upgrade in config_value(data, 'upgrades', path, dict).items():
+            upgrade_path = f"{path}.upgrades.{upgrade_key}"
+            upgrades[upgrade_key] = OrbitUpgrade(config_value(upgrade, 'text', upgrade_path, str), config_value(upgrade, 'max_level', upgrade_path, int),
+                                                 config_value(upgrade, 'effect', upgrade_path, default=0.0))
+        return WeaponStats(key, name, damage, sum(upgrade.max_level for upgrade in upgrades.values()), base_speed=config_value(data, 'base_speed', path), base_radius=config_value(data, 'base_radius', path),
+                           base_size=config_value(data, 'base_size', path, int), upgrades=upgrades)
+    reduction = config_value(config_value(data, 'upgrade', path, dict), 'cooldown_reduction_percent', f"{path}.upgrade")
+    if reduction >= 1: raise ConfigError(f"{path}.upgrade.cooldown_reduction_percent: 必须小于 1")
+    return WeaponStats(key, name, damage, config_value(data, 'max_level', path, int), config_value(data, 'size', path, int),
+                       config_value(data, 'pierce', path, int, 0), config_value(data, 'base_cooldown', path), reduction)
+
+def compile_config(raw):
+    if not isinstance(raw, dict): raise ConfigError("config.json 顶层应为对象")
+    player = config_value(raw, 'player_stats', 'config', dict); game = config_value(raw, 'game_settings', 'config', dict)
+    settings = GameSettings(config_value(player, 'speed', 'player_stats'), config_value(player, 'health', 'player_stats'),
+                            config_value(game, 'initial_enemy_spawn_rate', 'game_settings', int), config_value(game, 'projectile_speed', 'game_settings'),
+                            config_value(game, 'vectorized_enemies', 'game_settings', bool, False),
+                            config_value(game, 'gem_merge_threshold', 'game_settings', int, 400), config_value(game, 'gem_merge_cell', 'game_settings', int, 200),
+                            config_value(game, 'max_live_enemies', 'game_settings', int, 500), config_value(game, 'spawn_batch_max', 'game_settings', int, 16),
+                            config_value(game, 'despawn_radius', 'game_settings', float, 1400.0), config_value(game, 'lod_stride', 'game_settings', int, 3))
+    if settings.gem_merge_cell <= 0: raise ConfigError("game_settings.gem_merge_cell: 必须大于 0")
+    if settings.gem_merge_threshold < 1: raise ConfigError("game_settings.gem_merge_threshold: 至少为 1")
+    if settings.initial_enemy_spawn_rate <= 0: raise ConfigError("game_settings.initial_enemy_spawn_rate: 必须大于 0")
+    if settings.lod_stride < 1: raise ConfigError("game_settings.lod_stride: 至少为 1（1 表示远处敌人也每 tick 更新）")
+    if settings.despawn_radius <= SPAWN_RING_RADIUS: raise ConfigError(f"game_settings.despawn_radius: 必须大于刷怪圈半径 {SPAWN_RING_RADIUS:.0f}")
+    section = raw.get('frame_governor', {}); path = 'frame_governor'
+    governor = GovernorSettings(config_value(section, 'enabled', path, bool, True), config_value(section, 'budget_ms', path, float, TICK_MS),
+                                config_value(section, 'window_frames', path, int, 60), config_value(section, 'degrade_above', path, float, 1.1),
+                                config_value(section, 'recover_below', path, float, 0.7), config_value(section, 'recover_hold_frames', path, int, 180))
+    if governor.budget_ms <= 0 or governor.window_frames <= 0: raise ConfigError("frame_governor: budget_ms 和 window_frames 必须大于 0")
+    if governor.recover_below >= governor.degrade_above: raise ConfigError("frame_governor.recover_below: 必须小于 degrade_above，否则档位会来回抖动")
+    enemies = {}
+    for key, data in config_value(raw, 'enemy_stats', 'config', dict).items():
+        path = f"enemy_stats.{key}"
+        enemies[key] = EnemyStats(config_value(data, 'health', path), config_value(data, 'speed', path), config_value(data, 'damage', path), config_value(data, 'xp', path, int))
+    for key in ENEMY_CLASSES:
+        if key not in enemies: raise ConfigError(f"enemy_stats.{key}: 缺少敌人类型")
+    weapons = {key: compile_weapon(key, data) for key, data in config_value(raw, 'weapon_data', 'config', dict).items()}
+    for key in BASE_WEAPONS:
+        if key not in weapons: raise ConfigError(f"weapon_data.{key}: 缺少武器")
+    passives = {}
+    for key, data in config_value(raw, 'passive_data', 'config', dict).items():
+        path = f"passive_data.{key}"
+        passives[key] = PassiveStats(key, config_value(data, 'name', path, str), config_value(data, 'max_level', path, int), config_value(data, 'effect', path))
+    evolutions = []
+    for name, recipe in config_value(raw, 'evolution_recipes', 'config', dict).items():
+        path = f"evolution_recipes.{name}"
+        if name not in EVOLVED_WEAPONS: raise ConfigError(f"{path}: 没有对应的进化武器")
+        base = config_value(recipe, 'base_weapon', path, str); passive = config_value(recipe, 'passive_item', path, str)
+        if base not in weapons: raise ConfigError(f"{path}.base_weapon: 未知武器 {base}")
+        if passive not in passives: raise ConfigError(f"{path}.passive_item: 未知被动 {passive}")
+        evolutions.append(EvolutionRecipe(name, base, passive, EVOLVED_WEAPONS[name]))
+    return CompiledConfig(settings, enemies, weapons, passives, tuple(evolutions), governor)
+
+def load_config(path):
+    try:
+        with open(path, 'r') as f: raw = json.load(f)
+    except (OSError, json.JSONDecodeError) as e: raise ConfigError(f"{path} 文件未找到或格式错误：{e}") from e
+    return raw, compile_config(raw)
+
+# --- 刷怪 ---
+class WaveSpawner:
+    # 按预算成批刷怪：每 tick 按当前刷怪间隔攒额度，攒够几只就一次刷几只，
+    # 受单 tick 批量上限和场上存活上限约束；跑出回收半径的敌人挪回刷怪圈重新逼近
+    def __init__(self, game):
+        self.game = game; self.budget = 0.0; self.interval = game.stats.settings.initial_enemy_spawn_rate
+
+    def update(self):
+        game = self.game; settings = game.stats.settings
+        if game.sim_clock.ticks % RECYCLE_CHECK_TICKS == 0: self.recycle(settings.despawn_radius)
+        self.budget += TICK_MS / self.interval
+        room = settings.max_live_enemies - (len(game.enemies) - len(game.bosses))  # Boss 由定时器刷出，不占上限
+        if room <= 0: self.budget = min(self.budget, 1.0); return  # 满员时不囤额度，免得一空出位置就刷一大波
+        batch = min(int(self.budget), settings.spawn_batch_max, room)
+        for _ in range(batch): game.spawn_enemy("tank" if game.rng.random() < 0.2 else "enemy")
+        self.budget -= batch
+
+    def recycle(self, radius):
+        game = self.game; center = game.player.rect.center
+        if game.enemy_store is not None:
+            sprites = game.enemy_store.sprites
+            far = [sprites[row] for row in game.enemy_store.rows_beyond(center, radius).tolist()]
+        else:
+            cx, cy = center; far = [enemy for enemy in game.enemies if (enemy.rect.centerx - cx) ** 2 + (enemy.rect.centery - cy) ** 2 > radius * radius]
+        for enemy in far: enemy.spawn_at_edge()
+        return len(far)
 
 # --- 游戏主类 ---
 class Game:
-    def __init__(self):
-        pygame.mixer.pre_init(44100, -16, 2, 512); pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("类吸血鬼幸存者游戏 - 数据驱动版"); self.clock = pygame.time.Clock()
+    def __init__(self, headless=False, seed=None, config=None):
+        # 无头模式：不开窗口、不出声、不按真实时间限帧，用于批量模拟
+        # 没给种子时也随机挑一个记下来，任何一局都能复现
+        self.headless = headless; self.seed = seed if seed is not None else random.randrange(2 ** 32); self.rng = random.Random(self.seed)
+        self.show_damage_numbers = not headless; self.frame_limit = True; self.recorder = None; self.replayer = None
+        self.autopilot = None  # 可选的 callable(game) -> 移动位掩码，供无头跑批的机器人接管移动
+        self.startup_timings = {}; started = checkpoint = time.perf_counter()
+        if headless:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy'); os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+            pygame.init(); self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            pygame.mixer.pre_init(44100, -16, 2, 512); pygame.init()
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("类吸血鬼幸存者游戏 - 数据驱动版")
+        self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 50); self.small_font = pygame.font.Font(None, 36)
-        self.ui_font = pygame.font.Font(None, 24); self.running = True
-        self.load_data(); self.load_sounds(); self.create_item_icons(); self.setup_game()
-
-    def load_data(self):
-        try:
-            with open('config.json', 'r') as f:
-                self.config = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("错误：config.json 文件未找到或格式错误！")
-            self.config = {}
+        self.ui_font = pygame.font.Font(None, 24); self.text_cache = TextCache(); self.running = True
+        self.profiler = NullProfiler(); self.show_profiler = False; self.profiler_overlay = None; self.census = None
+        checkpoint = self.record_startup('display', checkpoint)
+        self.load_data(config); checkpoint = self.record_startup('config', checkpoint)
+        self.load_sounds(); checkpoint = self.record_startup('sounds', checkpoint)
+        self.create_item_icons(); self.background = ChunkedBackground(); checkpoint = self.record_startup('graphics', checkpoint)
+        self.setup_game(); self.record_startup('setup', checkpoint); self.record_startup('total', started)
+        if not headless: print("启动耗时 (ms): " + " | ".join(f"{name} {ms:.1f}" for name, ms in self.startup_timings.items()))
+
+    def config_hash(self): return hashlib.sha1(json.dumps(self.config, sort_keys=True).encode()).digest()
+
+    def start_recording(self, path):
+        self.recorder = InputRecorder(path, self.seed, self.config_hash())
+
+    def stop_recording(self):
+        if self.recorder is not None: self.recorder.close(); self.recorder = None
+
+    def start_replay(self, log):
+        if log.config_hash != self.config_hash(): print("警告：录像时的 config.json 与当前不同，回放结果可能不一致")
+        self.replayer = InputReplayer(log)
+
+    def save_snapshot(self, path):
+        started = time.perf_counter()
+        Snapshot(self.seed, self.config_hash(), self.sim_clock.ticks, *self.capture_state()).save(path)
+        return (time.perf_counter() - started) * 1000
+
+    def load_snapshot(self, path):
+        snapshot = Snapshot.load(path)
+        if snapshot.config_hash != self.config_hash(): print("警告：存档时的 config.json 与当前不同，读档后数值以当前配置为准")
+        started = time.perf_counter(); self.seed = snapshot.seed; self.restore_state(snapshot)
+        return (time.perf_counter() - started) * 1000
+
+    def capture_state(self):
+        # 标量状态进 JSON；实体直接从仓库数组成批拷出。伤害数字只是表现，不存
+        player = self.player
+        next_uid = next(self.sprite_ids); self.sprite_ids = itertools.count(next_uid)  # count 没法只看不取，取出来再接上
+        stores = {name: getattr(self, name) for name in ('enemy_store', 'particles', 'gem_store') if getattr(self, name) is not None}
+        meta = {'ticks': self.sim_clock.ticks, 'timers': self.sim_clock.timers, 'rng': self.rng.getstate(),
+                'score': self.score, 'game_over': self.game_over, 'start_time': self.start_time,
+                'enemy_current_speed': self.enemy_current_speed, 'enemy_current_spawn_rate': self.enemy_current_spawn_rate,
+                'spawner': [self.spawner.budget, self.spawner.interval], 'acquired_base_weapons': sorted(self.acquired_base_weapons),
+                'player': {'center': player.rect.center, 'health': player.health, 'level': player.level, 'experience': player.experience,
+                           'experience_to_next_level': player.experience_to_next_level, 'last_move_dir': tuple(player.last_move_dir),
+                           'invincible': player.invincible, 'upgrades': player.upgrades,
+                           'items': [[name, None if isinstance(item, Weapon) else item] for name, item in player.items.items()]},
+                'weapons': [[name, {key: getattr(weapon, key) for key in WEAPON_STATE if key in vars(weapon)},
+                             [orbiter.uid for orbiter in weapon.orbiters] if isinstance(weapon, OrbitWeapon) else []] for name, weapon in self.weapon_instances.items()],
+                'sprite_ids': next_uid, 'layouts': {name: [store.used, store.free] for name, store in stores.items()},
+                'hit_cooldowns': [self.hit_cooldowns.tick, [[*key, due] for due, keys in self.hit_cooldowns.wheel.items() for key in keys]],
+                'near_view': list(self.near_view),
+                'level_up_choices': [{**choice, 'weapon': choice['weapon'].name if 'weapon' in choice else None, 'class': None}
+                                     for choice in self.level_up_choices] if self.level_up_state else None}
+
+        enemies = numpy.zeros(len(self.enemies), dtype=Snapshot.ENEMY); kinds = {cls: i for i, cls in enumerate(ENEMY_CLASSES.values())}
+        if self.enemy_store is not None:
+            store = self.enemy_store; rows = numpy.flatnonzero(store.active[:store.used]); sprites = [store.sprites[row] for row in rows.tolist()]
+            for field in ('x', 'y', 'health', 'speed', 'damage'): enemies[field] = getattr(store, field)[rows]
+            enemies['row'] = rows
+        else:
+            sprites = list(self.enemies)
+            enemies['x'] = [enemy.rect.centerx for enemy in sprites]; enemies['y'] = [enemy.rect.centery for enemy in sprites]
+            for field in ('health', 'speed', 'damage'): enemies[field] = [getattr(enemy, field) for enemy in sprites]
+        enemies['kind'] = [kinds[type(enemy)] for enemy in sprites]; enemies['xp'] = [enemy.xp_value for enemy in sprites]; enemies['uid'] = [enemy.uid for enemy in sprites]
+
+        store = self.particles; rows = numpy.flatnonzero(store.active[:store.used]); particles = numpy.zeros(len(rows), dtype=Snapshot.PARTICLE)
+        for field in Snapshot.PARTICLE_FIELDS: particles[field] = getattr(store, field)[rows]
+        particles['kind'] = [PARTICLE_KINDS.index(type(store.sprites[row])) for row in rows.tolist()]
+        particles['row'] = rows; particles['uid'] = [store.sprites[row].uid for row in rows.tolist()]
+
+        store = self.gem_store; rows = numpy.flatnonzero(store.active[:store.used]); gems = numpy.zeros(len(rows), dtype=Snapshot.GEM)
+        for field in ('x', 'y', 'xp_value'): gems[field] = getattr(store, field)[rows]
+        gems['row'] = rows
+        gems['merged'] = [store.sprites[row].merged for row in rows.tolist()]
+
+        chests = numpy.zeros(len(self.treasure_chests), dtype=Snapshot.CHEST)
+        chests['x'] = [chest.rect.centerx for chest in self.treasure_chests]; chests['y'] = [chest.rect.centery for chest in self.treasure_chests]
+        return meta, {b'ENMY': enemies, b'PART': particles, b'GEMS': gems, b'CHST': chests}
+
+    def restore_state(self, snapshot):
+        # 先开一局新的再按存档改写；实体构造时会消耗随机数，所以随机数状态最后才恢复
+        self.setup_game(); meta = snapshot.meta; player = self.player
+        for weapon in self.weapon_instances.values(): weapon.kill()
+        self.weapon_instances = {}; player.items = {}
+        self.sim_clock.ticks = meta['ticks']; self.sim_clock.timers = {key: list(timer) for key, timer in meta['timers'].items()}
+        self.score = meta['score']; self.game_over = meta['game_over']; self.start_time = meta['start_time']
+        self.enemy_current_speed = meta['enemy_current_speed']; self.enemy_current_spawn_rate = meta['enemy_current_spawn_rate']
+        self.spawner.budget, self.spawner.interval = meta['spawner']; self.acquired_base_weapons = set(meta['acquired_base_weapons'])
+
+        state = meta['player']; player.rect.center = state['center']; player.last_move_dir = pygame.math.Vector2(state['last_move_dir'])
+        for key in ('level', 'experience', 'experience_to_next_level', 'invincible'): setattr(player, key, state[key])
+        player.upgrades.update(state['upgrades']); player.refresh_stats(); player.health = state['health']
+        for name, weapon_state, orbiter_uids in meta['weapons']:
+            weapon = ALL_WEAPONS[name](player, self); self.weapon_instances[name] = weapon; self.add_sprite(weapon, self.active_weapons)
+            for key, value in weapon_state.items(): setattr(weapon, key, value)
+            if isinstance(weapon, OrbitWeapon):
+                for _ in range(weapon.count_level): weapon.add_orbiter()
+                for orbiter, uid in zip(weapon.orbiters, orbiter_uids): orbiter.uid = uid
+            weapon.refresh_stats()
+        for name, value in state['items']: player.items[name] = self.weapon_instances[name] if value is None else value
+
+        # 仓库先按存档预留行号，实体照原来的行落位，最后换回原来的空闲表
+        layouts = meta['layouts']; enemies = snapshot.arrays[b'ENMY']; particles = snapshot.arrays[b'PART']; gems = snapshot.arrays[b'GEMS']
+        for name, rows in (('enemy_store', enemies), ('particles', particles), ('gem_store', gems)):
+            store = getattr(self, name)
+            if store is not None and name in layouts: store.reserve(layouts[name][0], rows['row'].tolist())
+        for record in enemies.tolist():
+            kind, _, uid, x, y, health, speed, damage, xp = record
+            enemy = ENEMY_CLASSES[ENEMY_KINDS[kind]](player, EnemyStats(health, speed, damage, xp)); self.add_sprite(enemy, *self.enemy_groups(ENEMY_KINDS[kind])); enemy.place(x, y); enemy.uid = uid
+        for record, kind, uid in zip(particles, particles['kind'].tolist(), particles['uid'].tolist()):
+            if PARTICLE_KINDS[kind] is Axe: particle = self.axe_pool.acquire(self, (record['x'], record['y']), 1.0, self.stats.weapons['axe_weapon']); group = self.axes
+            else: particle = self.projectile_pool.acquire(self, (record['x'], record['y']), (record['x'], record['y'] - 1), 1.0, self.stats.weapons['projectile_weapon']); group = self.projectiles
+            for field in Snapshot.PARTICLE_FIELDS: getattr(self.particles, field)[particle.row] = record[field]
+            self.add_sprite(particle, group); particle.uid = uid
+        for _, x, y, xp_value, merged in gems.tolist():
+            gem = self.gem_pool.acquire(self, (x, y), xp_value); self.experience_gems.add(gem); self.gem_grid.insert(gem)
+            if merged: gem.mark_merged()
+        for name, (_, free) in layouts.items():
+            if getattr(self, name) is not None: getattr(self, name).free = free
+        for x, y in snapshot.arrays[b'CHST'].tolist(): self.add_sprite(TreasureChest((x, y)), self.treasure_chests)
+
+        cooldowns = self.hit_cooldowns; cooldowns.tick, entries = meta['hit_cooldowns']
+        for source, target, due in entries: cooldowns.expiry[(source, target)] = due; cooldowns.wheel[due].append((source, target))
+        self.sprite_ids = itertools.count(meta['sprite_ids'])
+
+        choices = meta['level_up_choices']; self.level_up_state = choices is not None
+        if choices is not None:
+            for choice in choices:
+                if choice['type'] == 'weapon_upgrade': choice['weapon'] = self.weapon_instances[choice['weapon']]
+                else: del choice['weapon']
+                if choice['type'] == 'new_weapon': choice['class'] = ALL_WEAPONS[choice['name']]
+                else: del choice['class']
+            self.level_up_choices = choices
+        version, state, gauss = meta['rng']; self.rng.setstate((version, tuple(state), gauss))
+        # 碰撞网格按存档那一 tick 的近处范围重建：读档后第一帧的瞄准、绘制和自动驾驶都要用到
+        self.camera.update(player); self.near_view = pygame.Rect(meta['near_view']); self.rebuild_enemy_grid()
+
+    def read_movement(self):
+        if self.replayer is not None: mask = self.replayer.movement()
+        elif self.autopilot is not None: mask = self.autopilot(self)
+        elif self.headless: mask = 0
+        else:
+            keys = pygame.key.get_pressed(); mask = 0
+            if keys[pygame.K_LEFT] or keys[pygame.K_a]: mask |= MOVE_LEFT
+            if keys[pygame.K_RIGHT] or keys[pygame.K_d]: mask |= MOVE_RIGHT
+            if keys[pygame.K_UP] or keys[pygame.K_w]: mask |= MOVE_UP
+            if keys[pygame.K_DOWN] or keys[pygame.K_s]: mask |= MOVE_DOWN
+        if self.recorder is not None: self.recorder.movement(mask)
+        return mask
+
+    def issue_command(self, kind, arg=0):
+        # 所有影响模拟的玩家操作都经过这里，录制时按当前 tick 记下
+        if self.recorder is not None: self.recorder.command(self.sim_clock.ticks, kind, arg)
+        self.apply_command(kind, arg)
+
+    def apply_command(self, kind, arg):
+        if kind == CMD_CHOICE:
+            if self.level_up_state and arg < len(self.level_up_choices): self.apply_upgrade(self.level_up_choices[arg])
+        elif kind == CMD_LEVEL_UP: self.player.level_up()
+        elif kind == CMD_GAIN_XP: self.player.gain_experience(arg)
+        elif kind == CMD_INVINCIBLE: self.player.invincible = not self.player.invincible
+        elif kind == CMD_QUALITY: self.set_quality(arg)
+
+    def set_quality(self, tier):
+        self.quality_tier = tier; self.quality = QUALITY_TIERS[tier]
+        self.gem_merge_threshold = max(1, int(self.stats.settings.gem_merge_threshold * self.quality.gem_merge_scale))
+
+    def enable_profiler(self, export_path=None):
+        self.profiler.close(); self.profiler = FrameProfiler(export_path=export_path)
+
+    def enable_census(self, path, interval_ticks):
+        if self.census is not None: self.census.close()
+        self.census = MemoryCensus(path, interval_ticks)
+
+    def entity_counts(self):
+        return {'all_sprites': len(self.all_sprites), 'enemies': len(self.enemies), 'projectiles': len(self.projectiles), 'axes': len(self.axes),
+                'orbiters': len(self.orbiters), 'gems': len(self.experience_gems), 'chests': len(self.treasure_chests), 'damage_numbers': len(self.damage_numbers), 'hit_cooldowns': len(self.hit_cooldowns),
+                'quality_tier': self.quality_tier}
+
+    def record_startup(self, name, since):
+        now = time.perf_counter(); self.startup_timings[name] = (now - since) * 1000
+        return now
+
+    def load_data(self, config=None):
+        # 配置有误直接抛 ConfigError，不带着残缺的配置跑起来；直接传入的配置字典不做热重载
+        if config is not None: self.config_path = None; self.config = config; self.stats = compile_config(config); return
+        self.config_path = 'config.json'; self.config, self.stats = load_config(self.config_path)
+        self.config_mtime = os.stat(self.config_path).st_mtime
+
+    def check_config_reload(self):
+        # 按修改时间热重载；新配置校验不过就保留旧的继续跑
+        if self.config_path is None: return
+        try: mtime = os.stat(self.config_path).st_mtime
+        except OSError: return
+        if mtime == self.config_mtime: return
+        self.config_mtime = mtime
+        try: config, stats = load_config(self.config_path)
+        except ConfigError as e: print(f"config.json 重载失败，继续使用旧配置：{e}"); return
+        self.config = config; self.stats = stats; self.apply_stats()
+        print("已重新加载 config.json")
+
+    def apply_stats(self):
+        # 把新数值推给存活的对象；敌人类型、网格等结构性开关在下一局生效
+        self.player.refresh_stats(); self.player.heal(0)
+        for weapon in self.weapon_instances.values(): weapon.refresh_stats()
+        self.set_quality(self.quality_tier); self.gem_merge_cell = self.stats.settings.gem_merge_cell; self.governor.settings = self.stats.governor
 
     def create_item_icons(self):
         self.item_icons = {"spinach": pygame.Surface([40, 40], pygame.SRCALPHA), "magnet": pygame.Surface([40, 40], pygame.SRCALPHA), "candelabrador": pygame.Surface([40, 40], pygame.SRCALPHA)}
@@ -383,28 +1744,57 @@ class Game:
         self.item_icons["candelabrador"].fill(BROWN); pygame.draw.rect(self.item_icons["candelabrador"], GOLD, (15, 0, 10, 40))
 
     def load_sounds(self):
+        if self.headless:
+            self.sounds = {name: SilentSound() for name in ('shoot', 'enemy_hit', 'player_hit', 'level_up', 'gem_pickup', 'evolve')}
+            self.music_channel = SilentSound(); self.audio = SilentSound(); self.bgm = None; return
+        # 短音效同步生成；第一帧用不到的长音频交给后台线程
+        self.asset_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='assets')
+        self.bgm = LazySound(self.asset_loader.submit(generate_sound, 110, 2.0)); self.bgm.set_volume(MUSIC_VOLUME)
         self.sounds = {'shoot': generate_sound(880, 0.1), 'enemy_hit': generate_sound(220, 0.1),
             'player_hit': generate_sound(110, 0.3), 'level_up': generate_sound(1320, 0.5),
-            'gem_pickup': generate_sound(1760, 0.05), 'evolve': generate_sound(1500, 1.0)}
+            'gem_pickup': generate_sound(1760, 0.05), 'evolve': LazySound(self.asset_loader.submit(generate_sound, 1500, 1.0))}
         for sound in self.sounds.values(): sound.set_volume(SFX_VOLUME)
-        self.music_channel = pygame.mixer.Channel(0); self.bgm = generate_sound(110, 2.0); self.bgm.set_volume(MUSIC_VOLUME)
+        self.music_channel = pygame.mixer.Channel(0); self.audio = SoundDispatcher(self.sounds)
+
+    def start_music(self):
+        if self.music_started or self.bgm is None or not self.bgm.ready(): return
+        self.music_channel.play(self.bgm.sound, loops=-1); self.music_started = True
+        if self.paused: self.music_channel.pause()
 
     def add_sprite(self, sprite, *groups):
-        sprite.game = self; self.all_sprites.add(sprite)
+        # uid 每次入场都换新，池里复用的精灵不会继承上一次的免伤记录
+        sprite.game = self; sprite.uid = next(self.sprite_ids); self.all_sprites.add(sprite)
+        if self.census is not None: self.census.track(sprite)
         for group in groups: group.add(sprite)
 
     def setup_game(self):
+        self.stop_recording()
         self.game_over = False; self.level_up_state = False; self.paused = False; self.score = 0
-        self.start_time = pygame.time.get_ticks(); self.enemy_current_speed = self.config['enemy_stats']['enemy']['speed']
-        self.enemy_current_spawn_rate = self.config['game_settings']['initial_enemy_spawn_rate']
+        self.sim_clock = SimulationClock(); self.hit_cooldowns = HitCooldowns(); self.sprite_ids = itertools.count()
+        settings = self.stats.settings
+        self.start_time = self.sim_clock.now; self.enemy_current_speed = self.stats.enemies['enemy'].speed
+        self.enemy_current_spawn_rate = settings.initial_enemy_spawn_rate
         
-        self.all_sprites = pygame.sprite.Group(); self.enemies = pygame.sprite.Group()
+        self.all_sprites = pygame.sprite.Group(); self.enemies = pygame.sprite.Group(); self.bosses = pygame.sprite.Group()
         self.active_weapons = pygame.sprite.Group()
         self.projectiles = pygame.sprite.Group(); self.axes = pygame.sprite.Group(); self.orbiters = pygame.sprite.Group()
         self.experience_gems = pygame.sprite.Group(); self.treasure_chests = pygame.sprite.Group()
-
-        self.player = Player(self, self.config); self.add_sprite(self.player)
-        self.camera = Camera(WORLD_SIZE[0], WORLD_SIZE[1]); self.background = self.create_background()
+        self.damage_numbers = pygame.sprite.Group()
+        self.gem_store = GemStore(); self.particles = ParticleStore()
+        self.gem_merge_cell = settings.gem_merge_cell; self.damage_number_ids = itertools.count()
+        # 新开一局总是从最高画质开始，录像从第一帧起就和回放一致
+        self.governor = FrameGovernor(self.stats.governor); self.set_quality(0)
+        self.projectile_pool = SpritePool(Projectile, 256); self.axe_pool = SpritePool(Axe, 128)
+        self.gem_pool = SpritePool(ExperienceGem, 1024); self.damage_number_pool = SpritePool(DamageNumber, 256)
+        self.enemy_grid = SpatialHash(); self.gem_grid = SpatialHash(); self.flow_field = FlowField()
+        self.enemy_store = EnemyStore() if settings.vectorized_enemies else None
+
+        self.player = Player(self); self.add_sprite(self.player)
+        # 绘制层级由下到上；带网格的层只向网格查询视野内的精灵
+        self.draw_layers = [(self.treasure_chests, None), (self.experience_gems, self.gem_grid), (self.enemies, self.enemy_grid),
+                            (pygame.sprite.GroupSingle(self.player), None), (self.orbiters, None), (self.projectiles, None),
+                            (self.axes, None), (self.damage_numbers, None)]
+        self.camera = Camera(WORLD_SIZE[0], WORLD_SIZE[1]); self.update_lod()
 
         self.weapon_pool = {"orbit_weapon": OrbitWeapon, "axe_weapon": AxeWeapon}
         self.acquired_base_weapons = set()
@@ -416,23 +1806,62 @@ class Game:
         self.player.items[main_weapon.name] = main_weapon
         main_weapon.level = 1
         
-        self.enemy_spawn_timer = pygame.USEREVENT + 1; pygame.time.set_timer(self.enemy_spawn_timer, self.enemy_current_spawn_rate)
-        self.difficulty_timer = pygame.USEREVENT + 2; pygame.time.set_timer(self.difficulty_timer, 20000)
-        self.boss_spawn_timer = pygame.USEREVENT + 3; pygame.time.set_timer(self.boss_spawn_timer, 120000)
-        self.music_channel.play(self.bgm, loops=-1)
-
-    def create_background(self):
-        bg = pygame.Surface(WORLD_SIZE); bg.fill(DARK_GREY)
-        for x in range(0, WORLD_SIZE[0], 50): pygame.draw.line(bg, GREY, (x, 0), (x, WORLD_SIZE[1]))
-        for y in range(0, WORLD_SIZE[1], 50): pygame.draw.line(bg, GREY, (0, y), (WORLD_SIZE[0], y))
-        return bg
+        self.spawner = WaveSpawner(self)
+        self.difficulty_timer = 'difficulty'; self.sim_clock.set_timer(self.difficulty_timer, 20000)
+        self.boss_spawn_timer = 'boss_spawn'; self.sim_clock.set_timer(self.boss_spawn_timer, 120000)
+        self.music_started = False; self.start_music()
 
     def run(self):
-        while self.running:
-            self.events()
-            if not self.game_over and not self.level_up_state and not self.paused: self.update()
-            self.draw(); self.clock.tick(60)
-        pygame.quit()
+        # 固定步长：按真实流逝时间累计，每满一个 TICK_MS 推进一次模拟，渲染与模拟解耦
+        lag = 0.0; next_reload_check = time.perf_counter() + CONFIG_RELOAD_SECONDS
+        try:
+            while self.running:
+                # 录制和回放时都不热重载：录像头里只记了开录时的配置哈希，中途换配置回放就对不上；改动等录制结束后再生效
+                if self.replayer is None and self.recorder is None and time.perf_counter() >= next_reload_check:
+                    next_reload_check = time.perf_counter() + CONFIG_RELOAD_SECONDS; self.check_config_reload()
+                profiler = self.profiler; started = profiler.start()
+                self.events(); self.start_music(); profiler.mark('events', started)
+                if self.headless or not self.frame_limit: lag = TICK_MS; self.clock.tick()
+                else: lag = min(lag + self.clock.tick(TICK_RATE), TICK_MS * MAX_CATCHUP_TICKS)
+                while lag >= TICK_MS:
+                    self.step(); lag -= TICK_MS
+                self.audio.flush()
+                if not self.headless: started = profiler.start(); self.draw(); profiler.mark('draw', started)
+                if self.governed and not (self.paused or self.level_up_state or self.game_over):
+                    # get_rawtime 是上一帧真正干活的时间，不含 tick 的等待
+                    tier = self.governor.observe(self.clock.get_rawtime())
+                    if tier is not None: self.issue_command(CMD_QUALITY, tier)
+                if profiler.enabled: profiler.end_frame(self.entity_counts())
+        except Exception:
+            # 崩溃时尽量留一份存档，可以用 --resume 接着玩
+            if self.replayer is None:
+                try: self.save_snapshot(CRASH_SNAPSHOT_PATH); print(f"游戏异常退出，已存档到 {CRASH_SNAPSHOT_PATH}")
+                except Exception: pass
+            raise
+        finally:
+            self.stop_recording(); self.profiler.close()
+            if self.census is not None: self.census.close(self)  # 退出前再记一次，浸泡测试看首尾差异
+            pygame.quit()
+
+    @property
+    def governed(self):
+        # 只在有窗口的实时对局里按帧耗时降级；回放照录像里的档位切换命令走，无头跑批不降级
+        return not self.headless and self.replayer is None
+
+    def step(self):
+        if self.replayer is not None and not self.paused:
+            # 回放：先执行录在当前 tick 的命令；录像放完或游戏结束就停止
+            for kind, arg in self.replayer.pending(self.sim_clock.ticks): self.apply_command(kind, arg)
+            if self.replayer.finished or self.game_over: self.running = False; return
+        if not self.game_over and not self.level_up_state and not self.paused: self.update()
+        if self.census is not None: self.census.poll(self)
+
+    def simulate(self, ticks):
+        # 无头快进：没有玩家选择时取第一个（已被随机打乱的）升级选项
+        for _ in range(ticks):
+            if self.game_over: break
+            if self.level_up_state: self.issue_command(CMD_CHOICE, 0)
+            self.step()
 
     def events(self):
         for event in pygame.event.get():
@@ -442,10 +1871,19 @@ class Game:
                     self.paused = not self.paused
                     if self.paused: self.music_channel.pause()
                     else: self.music_channel.unpause()
-                if event.key == pygame.K_l: self.player.level_up()
-                if event.key == pygame.K_x: self.player.gain_experience(100)
-                if event.key == pygame.K_i: self.player.invincible = not self.player.invincible
+                if self.replayer is None:
+                    if event.key == pygame.K_l: self.issue_command(CMD_LEVEL_UP)
+                    if event.key == pygame.K_x: self.issue_command(CMD_GAIN_XP, 100)
+                    if event.key == pygame.K_i: self.issue_command(CMD_INVINCIBLE)
+                if event.key == pygame.K_F5 and not self.game_over:
+                    print(f"已存档到 {QUICKSAVE_PATH}（{self.save_snapshot(QUICKSAVE_PATH):.1f} ms）")
+                if event.key == pygame.K_F9 and self.recorder is None and self.replayer is None and os.path.exists(QUICKSAVE_PATH):
+                    print(f"已读档 {QUICKSAVE_PATH}（{self.load_snapshot(QUICKSAVE_PATH):.1f} ms）"); continue
+                if event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                    if self.show_profiler and not self.profiler.enabled: self.enable_profiler()
             
+            if self.replayer is not None: continue
             if self.game_over:
                 if event.type == pygame.KEYDOWN: self.setup_game()
                 continue
@@ -453,19 +1891,24 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     for i in range(len(self.level_up_choices)):
                         if event.key == getattr(pygame, f"K_{i+1}") or event.key == getattr(pygame, f"K_KP{i+1}"):
-                            self.apply_upgrade(self.level_up_choices[i]); break
+                            self.issue_command(CMD_CHOICE, i); break
                 continue
-            if self.paused: continue
 
-            if event.type == self.enemy_spawn_timer:
-                enemy_type = "tank" if random.random() < 0.2 else "enemy"
-                self.add_sprite(TankEnemy(self.player, self.config['enemy_stats'][enemy_type]) if enemy_type == 'tank' else Enemy(self.player, self.config['enemy_stats'][enemy_type]), self.enemies)
-            if event.type == self.difficulty_timer: self.increase_difficulty()
-            if event.type == self.boss_spawn_timer: self.add_sprite(BossEnemy(self.player, self.config['enemy_stats']['boss']), self.enemies)
+    def handle_timer(self, timer):
+        if timer == self.difficulty_timer: self.increase_difficulty()
+        if timer == self.boss_spawn_timer: self.spawn_enemy('boss')
+
+    def enemy_groups(self, kind):
+        # Boss 另进 bosses 组，刷怪器的存活上限只数普通敌人
+        return (self.enemies, self.bosses) if kind == 'boss' else (self.enemies,)
+
+    def spawn_enemy(self, kind):
+        enemy = ENEMY_CLASSES[kind](self.player, self.stats.enemies[kind]); self.add_sprite(enemy, *self.enemy_groups(kind))
+        return enemy
 
     def increase_difficulty(self):
         self.enemy_current_speed *= 1.1; self.enemy_current_spawn_rate = max(200, int(self.enemy_current_spawn_rate * 0.9))
-        pygame.time.set_timer(self.enemy_spawn_timer, self.enemy_current_spawn_rate)
+        self.spawner.interval = self.enemy_current_spawn_rate
     
     def prepare_level_up_choices(self):
         self.level_up_state = True
@@ -481,14 +1924,14 @@ class Game:
         if len(self.weapon_instances) < 6:
             for name, weapon_class in self.weapon_pool.items():
                 if name not in self.acquired_base_weapons and name not in self.weapon_instances:
-                    possible_upgrades.append({"type": "new_weapon", "name": name, "class": weapon_class, "text": f"Get: {weapon_class(self.player, self).data['name']}", "level": 0})
+                    possible_upgrades.append({"type": "new_weapon", "name": name, "class": weapon_class, "text": f"Get: {self.stats.weapons[name].name}", "level": 0})
 
-        for key, data in self.config['passive_data'].items():
-            if self.player.upgrades[key] < data['max_level']:
-                possible_upgrades.append({"type": "passive", "key": key, "text": data['name'], "level": self.player.upgrades[key]})
+        for key, passive in self.stats.passives.items():
+            if self.player.upgrades[key] < passive.max_level:
+                possible_upgrades.append({"type": "passive", "key": key, "text": passive.name, "level": self.player.upgrades[key]})
         
         possible_upgrades.append({"type": "heal", "key": "heal", "text": "Restore 30% Health", "level": 0})
-        self.level_up_choices = random.sample(possible_upgrades, min(len(possible_upgrades), 4))
+        self.level_up_choices = self.rng.sample(possible_upgrades, min(len(possible_upgrades), 4))
 
     def apply_upgrade(self, choice):
         type = choice["type"]
@@ -506,39 +1949,26 @@ class Game:
             weapon = choice["weapon"]
             key = choice["key"]
             if isinstance(weapon, OrbitWeapon):
-                upgrade_data = weapon.data['upgrades'][key]
-                if key == "count": weapon.add_orbiter(); weapon.count_level += 1
-                elif key == "speed": weapon.orbiter_speed += upgrade_data['effect']; weapon.speed_level += 1
-                elif key == "size": weapon.orbiter_size += upgrade_data['effect']; weapon.size_level += 1; weapon.update_orbiter_visuals()
-            else:
-                 weapon.cooldown *= (1 - weapon.data['upgrade']['cooldown_reduction_percent'])
-                 weapon.level += 1
+                if key == "count": weapon.add_orbiter()
+                setattr(weapon, f"{key}_level", getattr(weapon, f"{key}_level") + 1)
+            else: weapon.level += 1
+            weapon.refresh_stats()
         elif type == "passive":
             key = choice["key"]
-            effect = self.config['passive_data'][key]['effect']
-            if key == "speed": self.player.speed += effect
-            elif key == "max_health": self.player.max_health += effect; self.player.heal(effect)
-            elif key == "magnet": self.player.magnet_radius += effect
-            elif key == "spinach": self.player.damage_multiplier += effect; self.player.items['spinach'] = self.player.upgrades['spinach'] + 1
-            elif key == "candelabrador": 
-                self.player.area_multiplier += effect; self.player.items['candelabrador'] = self.player.upgrades['candelabrador'] + 1
-                if "orbit_weapon" in self.weapon_instances:
-                    self.weapon_instances["orbit_weapon"].update_orbiter_visuals()
-            self.player.upgrades[key] += 1
+            self.player.upgrades[key] += 1; self.player.refresh_stats()
+            if key == "max_health": self.player.heal(self.stats.passives[key].effect)
+            elif key in ("spinach", "candelabrador"): self.player.items[key] = self.player.upgrades[key]
+            if key == "candelabrador" and "orbit_weapon" in self.weapon_instances:
+                self.weapon_instances["orbit_weapon"].update_orbiter_visuals()
         elif type == "heal": self.player.heal(self.player.max_health * 0.3)
         
         self.level_up_state = False; self.check_for_evolutions()
 
     def check_for_evolutions(self):
-        recipes = self.config['evolution_recipes']
-        for evolved_name, recipe in recipes.items():
-            base_weapon = self.weapon_instances.get(recipe['base_weapon'])
-            passive_name = recipe['passive_item']
-            if base_weapon and base_weapon.level >= base_weapon.data['max_level'] and self.player.upgrades[passive_name] >= self.config['passive_data'][passive_name]['max_level']:
-                evolved_class_name = evolved_name.replace('_', ' ').title().replace(' ', '')
-                if evolved_class_name in globals():
-                    evolved_class = globals()[evolved_class_name]
-                    self.evolve_weapon(recipe['base_weapon'], evolved_class)
+        for recipe in self.stats.evolutions:
+            base_weapon = self.weapon_instances.get(recipe.base_weapon)
+            if base_weapon and base_weapon.level >= base_weapon.data.max_level and self.player.upgrades[recipe.passive_item] >= self.stats.passives[recipe.passive_item].max_level:
+                self.evolve_weapon(recipe.base_weapon, recipe.weapon_class)
 
     def evolve_weapon(self, old_name, evolved_class):
         old_weapon = self.weapon_instances.pop(old_name)
@@ -548,60 +1978,118 @@ class Game:
         self.add_sprite(new_weapon, self.active_weapons)
         self.player.items.pop(old_name)
         self.player.items[new_weapon.name] = new_weapon
-        self.sounds['evolve'].play()
+        self.audio.play('evolve')
         self.game_over_text = self.font.render("WEAPON EVOLVED!", True, GOLD)
-        self.game_over_text_timer = pygame.time.get_ticks()
+        self.game_over_text_timer = self.sim_clock.now
 
     def handle_enemy_death(self, enemy):
         self.score += 1
         if isinstance(enemy, BossEnemy): self.add_sprite(TreasureChest(enemy.rect.center), self.treasure_chests)
-        else: self.add_sprite(ExperienceGem(enemy.rect.center, enemy.xp_value), self.experience_gems)
+        else:
+            # 宝石由 GemStore 批量更新，不进 all_sprites
+            gem = self.gem_pool.acquire(self, enemy.rect.center, enemy.xp_value)
+            self.experience_gems.add(gem); self.gem_grid.insert(gem)
+
+    def merge_gems(self):
+        # 先合并视野外的宝石（粗格子，玩家看不到跳变）；仍超过阈值就对全部宝石从细格子开始逐级加粗合并
+        store = self.gem_store
+        self.absorb_gems(*store.cluster(store.rows_outside(self.camera.get_view_rect()), self.gem_merge_cell))
+        # 格子大到盖住整个世界还吸收不了任何宝石，说明只剩一颗了，再加粗也没用
+        cell_size = XP_GEM_SIZE * 2; threshold = max(1, self.gem_merge_threshold)
+        while len(store) > threshold:
+            absorbed = self.absorb_gems(*store.cluster(numpy.flatnonzero(store.active[:store.used]), cell_size))
+            if not absorbed and cell_size >= max(WORLD_SIZE): break
+            cell_size *= 2
+
+    def absorb_gems(self, merged_rows, absorbed_rows):
+        # 返回被吸收掉的宝石数
+        sprites = self.gem_store.sprites
+        for row in absorbed_rows.tolist(): sprites[row].kill()
+        for row in merged_rows.tolist(): sprites[row].mark_merged()
+        return len(absorbed_rows)
 
     def update(self):
+        profiler = self.profiler; mark = profiler.start()
+        for timer in self.sim_clock.advance(): self.handle_timer(timer)
+        self.spawner.update()
+        self.hit_cooldowns.advance(self.sim_clock.ticks)
+        mark = profiler.mark('timers', mark)
+        self.flow_field.update(self.player.rect.center)
+        # LOD：视野附近的敌人每 tick 更新并进碰撞网格；更远的只朝玩家走，分片轮流、步长按比例放大。
+        # 远处没有飞行物、环绕物和玩家，不进网格也不会漏掉任何碰撞
+        self.update_lod()
         self.all_sprites.update(); self.camera.update(self.player)
-        
-        projectile_hits = pygame.sprite.groupcollide(self.projectiles, self.enemies, True, False)
-        for projectile, enemies_hit in projectile_hits.items():
-            if enemies_hit and enemies_hit[0].take_damage(projectile.damage):
-                self.handle_enemy_death(enemies_hit[0])
-
-        for axe in self.axes:
-            for enemy in pygame.sprite.spritecollide(axe, self.enemies, False):
-                if enemy not in axe.hit_enemies:
-                    axe.hit_enemies.add(enemy)
-                    if enemy.take_damage(axe.damage): self.handle_enemy_death(enemy)
-                    if len(axe.hit_enemies) >= axe.pierce: break
-        
+        if self.enemy_store is not None: self.enemy_store.step(self.player.rect.center, self.flow_field, self.near_view, self.lod_stride, self.sim_clock.ticks)
+        mark = profiler.mark('sprites', mark)
+        self.rebuild_enemy_grid()
+        mark = profiler.mark('grid', mark)
+
+        particles = self.particles; particles.step()
+        sprites = particles.sprites
+        for row in particles.rows_expired(self.camera.get_view_rect().inflate(200, 200)).tolist(): sprites[row].kill()
+        mark = profiler.mark('particles', mark)
+
+        cooldowns = self.hit_cooldowns
+        for particle, candidates in particles.hit_candidates(self.enemy_grid):
+            rect = particle.rect
+            for enemy in dict.fromkeys(candidates):
+                if not enemy.rect.colliderect(rect) or not enemy.alive(): continue
+                # 子弹命中即消失，不必登记免伤；斧头对同一敌人只打一次
+                if not particle.consumed_on_hit and not cooldowns.try_hit(particle, enemy, AXE_HIT_IMMUNITY_MS): continue
+                hits = particle.hits + 1; particle.hits = hits; damage = particle.damage
+                if hits >= particle.pierce and particle.consumed_on_hit: particle.kill()
+                if enemy.take_damage(damage): self.handle_enemy_death(enemy)
+                if hits >= particle.pierce: break
+        mark = profiler.mark('hits', mark)
         for orbiter in self.orbiters:
-            if not hasattr(orbiter, 'hit_cooldown'): orbiter.hit_cooldown = {}
-            now = pygame.time.get_ticks()
-            for enemy in pygame.sprite.spritecollide(orbiter, self.enemies, False):
-                if enemy not in orbiter.hit_cooldown or now - orbiter.hit_cooldown[enemy] > 500:
-                    orbiter.hit_cooldown[enemy] = now
+            for enemy in self.enemy_grid.query(orbiter.rect):
+                if cooldowns.try_hit(orbiter, enemy, ORBIT_HIT_COOLDOWN_MS):
                     if enemy.take_damage(orbiter.damage * self.player.damage_multiplier):
                         self.handle_enemy_death(enemy)
-            dead_enemies = [e for e in orbiter.hit_cooldown if not e.alive()]
-            for e in dead_enemies: del orbiter.hit_cooldown[e]
-        
-        for gem in pygame.sprite.spritecollide(self.player, self.experience_gems, True): self.player.gain_experience(gem.xp_value)
+        mark = profiler.mark('orbiters', mark)
+        if self.player.magnet_radius > 0:
+            for row in self.gem_store.pull(self.player.rect.center, self.player.magnet_radius).tolist(): self.gem_grid.move(self.gem_store.sprites[row])
+        if len(self.gem_store) > self.gem_merge_threshold: self.merge_gems()
+        # 按仓库行号拾取：网格格子里的顺序取决于宝石的移动历史，读档后复原不了，释放行的顺序不能依赖它
+        for gem in sorted(self.gem_grid.query(self.player.rect), key=lambda gem: gem.row):
+            xp_value = gem.xp_value; gem.kill(); self.player.gain_experience(xp_value)
         for chest in pygame.sprite.spritecollide(self.player, self.treasure_chests, True): self.player.gain_levels(3)
-        for enemy in pygame.sprite.spritecollide(self.player, self.enemies, True): self.player.take_damage(enemy.damage)
+        for enemy in self.enemy_grid.query(self.player.rect): enemy.kill(); self.player.take_damage(enemy.damage)
+        profiler.mark('pickups', mark)
+
+    def update_lod(self):
+        self.near_view = self.camera.get_view_rect().inflate(2 * LOD_NEAR_MARGIN, 2 * LOD_NEAR_MARGIN)
+        self.lod_stride = self.stats.settings.lod_stride * self.quality.lod_scale
+
+    def rebuild_enemy_grid(self):
+        near = self.near_view
+        if self.enemy_store is not None: self.enemy_grid.rebuild_spans(*self.enemy_store.cell_spans(self.enemy_grid.cell_size, near))
+        else: self.enemy_grid.rebuild(enemy for enemy in self.enemies if near.colliderect(enemy.rect))
 
     def draw(self):
-        self.screen.blit(self.background, self.camera.apply(self.background.get_rect()))
-        for sprite in self.all_sprites: self.screen.blit(sprite.image, self.camera.apply(sprite.rect))
+        self.background.draw(self.screen, self.camera.get_view_rect())
+        self.screen.blits(self.visible_blits(self.camera.get_view_rect()), doreturn=False)
         self.draw_player_health_bar()
         self.draw_ui()
         if self.level_up_state: self.show_level_up_screen()
         if self.game_over: self.show_game_over_screen()
         if self.paused: self.show_pause_screen()
+        if self.show_profiler: self.draw_profiler_overlay()
         
-        if hasattr(self, 'game_over_text_timer') and pygame.time.get_ticks() - self.game_over_text_timer < 2000:
+        if hasattr(self, 'game_over_text_timer') and self.sim_clock.now - self.game_over_text_timer < 2000:
              self.screen.blit(self.game_over_text, self.game_over_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2)))
         else:
             if hasattr(self, 'game_over_text_timer'): delattr(self, 'game_over_text_timer')
-        pygame.display.flip()
+        if not self.headless: pygame.display.flip()
     
+    def visible_blits(self, view):
+        ox, oy = self.camera.camera.topleft; blits = []
+        for group, grid in self.draw_layers:
+            sprites = grid.query(view) if grid is not None else [sprite for sprite in group if sprite.rect.colliderect(view)]
+            for sprite in sprites:
+                rect = sprite.rect; blits.append((sprite.image, (rect.x + ox, rect.y + oy)))
+        return blits
+
     def draw_player_health_bar(self):
         if self.player.health < self.player.max_health:
             bar_width = PLAYER_SIZE
@@ -623,13 +2111,16 @@ class Game:
                 if isinstance(item, Weapon): level = item.level
                 else: level = self.player.upgrades.get(name, 0)
                 
-                level_text = self.ui_font.render(f"Lvl {level}", True, WHITE)
+                level_text = self.text_cache.label(self.ui_font, f"Lvl {level}", WHITE)
                 self.screen.blit(level_text, (60, item_y + 10)); item_y += 50
         
-        survival_time = (pygame.time.get_ticks() - self.start_time) // 1000
-        time_text = self.font.render(f"{survival_time//60:02}:{survival_time%60:02}", True, WHITE)
+        survival_time = int(self.sim_clock.now - self.start_time) // 1000
+        time_text = self.text_cache.label(self.font, f"{survival_time//60:02}:{survival_time%60:02}", WHITE)
         self.screen.blit(time_text, time_text.get_rect(midtop=(SCREEN_WIDTH/2, 10)))
         
+        quality_text = self.text_cache.label(self.ui_font, f"Quality: {self.quality.name}", WHITE if self.quality_tier == 0 else ORANGE)
+        self.screen.blit(quality_text, quality_text.get_rect(bottomright=(SCREEN_WIDTH - 10, SCREEN_HEIGHT - 25)))
+
         xp_rect = pygame.Rect(10, SCREEN_HEIGHT - 20, SCREEN_WIDTH - 20, 15)
         pygame.draw.rect(self.screen, GREY, xp_rect)
         pygame.draw.rect(self.screen, YELLOW, (xp_rect.x, xp_rect.y, xp_rect.width * (self.player.experience / self.player.experience_to_next_level), xp_rect.height))
@@ -637,28 +2128,69 @@ class Game:
     def show_level_up_screen(self):
         overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA); overlay.fill((0, 0, 0, 180))
         self.screen.blit(overlay, (0, 0))
-        title = self.font.render("LEVEL UP! CHOOSE AN UPGRADE:", True, WHITE)
+        title = self.text_cache.label(self.font, "LEVEL UP! CHOOSE AN UPGRADE:", WHITE)
         self.screen.blit(title, title.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 150)))
         
         for i, choice in enumerate(self.level_up_choices):
             text = f"{i+1}: {choice['text']}"
             if choice['level'] > 0: text += f" (Lvl {choice['level']+1})"
             color = YELLOW if choice.get('key') == 'heal' else GREEN
-            option_text = self.small_font.render(text, True, color)
+            option_text = self.text_cache.label(self.small_font, text, color)
             self.screen.blit(option_text, option_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 60 + i * 40)))
 
+    def draw_profiler_overlay(self):
+        # 统计文字每半秒重排一次，其余帧直接贴上次的结果；数字列右对齐
+        if self.profiler_overlay is None or self.profiler.frame % 30 == 0:
+            rows = [('phase (ms)', 'avg', 'p99')] + [(name, f"{avg:.2f}", f"{p99:.2f}") for name, (avg, p99) in self.profiler.summary().items()]
+            rows += [(name, '', str(count)) for name, count in self.profiler.counts.items()]
+            line_height = self.ui_font.get_linesize()
+            self.profiler_overlay = pygame.Surface((240, line_height * len(rows) + 10), pygame.SRCALPHA); self.profiler_overlay.fill((0, 0, 0, 160))
+            for i, row in enumerate(rows):
+                y = 5 + i * line_height; self.profiler_overlay.blit(self.ui_font.render(row[0], True, WHITE), (5, y))
+                for text, right in zip(row[1:], (170, 235)):
+                    cell = self.ui_font.render(text, True, WHITE); self.profiler_overlay.blit(cell, cell.get_rect(topright=(right, y)))
+        self.screen.blit(self.profiler_overlay, (SCREEN_WIDTH - self.profiler_overlay.get_width() - 10, 10))
+
     def show_game_over_screen(self):
-        game_over_text = self.font.render("GAME OVER", True, WHITE)
-        restart_text = self.font.render("Press any key to restart", True, WHITE)
+        game_over_text = self.text_cache.label(self.font, "GAME OVER", WHITE)
+        restart_text = self.text_cache.label(self.font, "Press any key to restart", WHITE)
         self.screen.blit(game_over_text, game_over_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 30)))
         self.screen.blit(restart_text, restart_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 + 30)))
 
     def show_pause_screen(self):
         overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA); overlay.fill((0, 0, 0, 180))
         self.screen.blit(overlay, (0, 0))
-        pause_text = self.font.render("PAUSED", True, WHITE)
+        pause_text = self.text_cache.label(self.font, "PAUSED", WHITE)
         self.screen.blit(pause_text, pause_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2)))
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="类吸血鬼幸存者游戏")
+    parser.add_argument('--seed', type=int, help="随机种子")
+    parser.add_argument('--profile', action='store_true', help="开启逐帧分析并显示叠加层 (F3 切换)")
+    parser.add_argument('--profile-out', help="把每帧分析记录写入 .jsonl 或 .csv 文件")
+    parser.add_argument('--record', help="把本局输入录制到文件")
+    parser.add_argument('--replay', help="回放录像文件（种子取自录像）")
+    parser.add_argument('--fast', action='store_true', help="不限帧率，尽快跑完")
+    parser.add_argument('--headless', action='store_true', help="不开窗口、不出声")
+    parser.add_argument('--resume', help="从存档文件继续（F5 快速存档，F9 读档）")
+    parser.add_argument('--census', help="定期把实体数量、内存占用和疑似泄漏写入 .jsonl 文件（开启 tracemalloc，会变慢）")
+    parser.add_argument('--census-interval', type=float, default=10, help="内存普查间隔（游戏内秒）")
+    args = parser.parse_args(argv)
+    # 录像总是从第 0 tick 的新局开始回放，从存档中途录下的命令对不上
+    if args.resume and args.record: parser.error("--resume 不能和 --record 同时使用：录像只能从新开的一局开始")
+    log = InputLog.load(args.replay) if args.replay else None
+    try: game = Game(headless=args.headless, seed=log.seed if log else args.seed)
+    except ConfigError as e: parser.exit(1, f"错误：{e}\n")
+    game.frame_limit = not args.fast
+    if args.profile or args.profile_out: game.enable_profiler(args.profile_out); game.show_profiler = args.profile
+    if args.resume and not log: game.load_snapshot(args.resume)
+    if args.census: game.enable_census(args.census, max(1, int(args.census_interval * TICK_RATE)))
+    if log: game.start_replay(log)
+    if args.record: game.start_recording(args.record)
+    started = time.perf_counter(); game.run()
+    if log:
+        elapsed = time.perf_counter() - started
+        print(f"回放结束：{game.sim_clock.ticks} tick，用时 {elapsed:.2f} s，分数 {game.score}，等级 {game.player.level}，生命 {game.player.health:.0f}")
+
 if __name__ == '__main__':
-    game = Game()
-    game.run()
+    main()
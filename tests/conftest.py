@@ -0,0 +1,14 @@
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy'); os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def config():
+    # 每个测试一份新的配置字典，改了也不影响别的测试
+    with open(os.path.join(ROOT, 'config.json')) as f: return json.load(f)
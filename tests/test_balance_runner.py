@@ -0,0 +1,13 @@
+import pytest
+
+from balance_runner import summarize
+
+def result(curve, final_level):
+    return {'variant': 0, 'seed': 1, 'survival_s': 150.0, 'died': False, 'kills': 10, 'kills_per_min': 4.0, 'final_level': final_level,
+            'level_curve': curve, 'evolution_s': None, 'wall_s': 0.1}
+
+@pytest.mark.parametrize('minutes, curve, expected', [(0.5, [], [2]), (2.5, [2, 3], [2, 3, 4]), (3, [2, 3, 4], [2, 3, 4])])
+def test_level_curve_covers_partial_last_minute(minutes, curve, expected):
+    # 不满一分钟的尾巴用结束时的等级补上
+    row, = summarize([{}], [result(curve, expected[-1])], minutes)
+    assert row['level_curve'] == expected
@@ -0,0 +1,134 @@
+import json
+import math
+from types import SimpleNamespace
+
+import numpy
+import pygame
+import pytest
+
+from benchmark import fill_gems
+from gemini_survivor import (CMD_CHOICE, CMD_GAIN_XP, CMD_INVINCIBLE, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT, MOVE_UP, ConfigError, FlowField, Game, HitCooldowns,
+                             InputLog, compile_config)
+
+def state(game):
+    # 元数据过一遍 JSON（与存档文件里一致），数组比字节
+    meta, arrays = game.capture_state()
+    return json.loads(json.dumps(meta)), {tag: array.tobytes() for tag, array in arrays.items()}
+
+def gem_xp(game):
+    store = game.gem_store
+    return int(store.xp_value[numpy.flatnonzero(store.active[:store.used])].sum())
+
+# --- 流场 ---
+def walk(field, start, target, speed=2, limit=2000):
+    # 按流场走到目标附近，返回走过的路程；走不到返回 None
+    x, y = start; length = 0
+    for _ in range(limit):
+        direction = field.direction(x, y)
+        if direction is None: direction = pygame.math.Vector2(target[0] - x, target[1] - y).normalize()
+        x += direction.x * speed; y += direction.y * speed; length += speed
+        if field.blocked[int(y) // field.cell_size, int(x) // field.cell_size]: return None  # 穿墙了
+        if math.hypot(target[0] - x, target[1] - y) < 10: return length
+    return None
+
+@pytest.mark.parametrize('position, expected', [((1400, 1500), (1, 0)), ((1700, 1500), (-1, 0)), ((1500, 1800), (0, -1)),
+                                                ((1100, 900), (math.sqrt(0.5), math.sqrt(0.5)))])
+def test_flow_field_points_straight_at_player_in_open_space(position, expected):
+    # 远处有一面墙就会开启流场；空地上的格子不该被斜向偏置
+    field = FlowField(); field.set_obstacle(pygame.Rect(2000, 2000, 60, 60)); field.update((1500, 1500))
+    direction = field.direction(*position)
+    assert direction is not None and direction.x == pytest.approx(expected[0]) and direction.y == pytest.approx(expected[1])
+
+def test_flow_field_routes_around_wall():
+    wall = pygame.Rect(1320, 1200, 60, 600); field = FlowField(); field.set_obstacle(wall); field.update((1500, 1500))
+    length = walk(field, (1100, 1500), (1500, 1500))
+    # 绕墙的最短路约 755 像素；按格子走允许有些折线
+    assert length is not None and length < 900
+
+def test_flow_field_clears_when_obstacle_removed():
+    field = FlowField(); wall = pygame.Rect(1320, 1200, 60, 600)
+    field.set_obstacle(wall); field.update((1500, 1500)); assert field.routing
+    field.set_obstacle(wall, blocked=False); field.update((1500, 1500))
+    assert not field.routing and field.direction(1100, 1500) is None
+
+# --- 敌人移动 ---
+def enemy_travel(config, vectorized, kind, offset, stride=1, ticks=60):
+    # 场上只留一个敌人，按主循环的顺序推进移动，返回平均每 tick 的位移
+    config['game_settings'].update(vectorized_enemies=vectorized, lod_stride=stride)
+    game = Game(headless=True, seed=3, config=config)
+    for enemy in list(game.enemies): enemy.kill()
+    enemy = game.spawn_enemy(kind); px, py = game.player.rect.center; enemy.place(px + offset[0], py + offset[1]); start = enemy.rect.center
+    for _ in range(ticks):
+        game.sim_clock.ticks += 1; game.update_lod(); enemy.update()
+        if game.enemy_store is not None: game.enemy_store.step(game.player.rect.center, game.flow_field, game.near_view, stride, game.sim_clock.ticks)
+    return math.dist(start, enemy.rect.center) / ticks
+
+@pytest.mark.parametrize('kind', ['enemy', 'tank', 'boss'])
+@pytest.mark.parametrize('offset', [(1800, 0), (1500, 700), (300, 200), (-250, -400)])
+def test_enemy_store_moves_like_sprites(config, kind, offset):
+    # 批量仓库和精灵路径（Rect.move_ip 逐步截断）必须一样快，否则开关 vectorized_enemies 会改变难度
+    assert enemy_travel(config, True, kind, offset) == pytest.approx(enemy_travel(config, False, kind, offset))
+
+@pytest.mark.parametrize('vectorized', [True, False])
+@pytest.mark.parametrize('kind', ['enemy', 'tank'])
+@pytest.mark.parametrize('offset', [(1800, 0), (1500, 700), (-1200, -1300)])
+def test_far_enemies_travel_as_far_with_lod_stride(config, vectorized, kind, offset):
+    # 远处的敌人每 stride 个 tick 走一次，总路程要和每 tick 都走时一样
+    assert enemy_travel(config, vectorized, kind, offset, stride=3) == pytest.approx(enemy_travel(config, vectorized, kind, offset, stride=1))
+
+# --- 刷怪 ---
+def test_bosses_do_not_count_against_live_enemy_cap(config):
+    config['game_settings'].update(max_live_enemies=5, spawn_batch_max=50)
+    game = Game(headless=True, seed=3, config=config)
+    for enemy in list(game.enemies): enemy.kill()
+    game.spawn_enemy('boss'); game.spawner.budget = 20; game.spawner.update()
+    assert len(game.bosses) == 1 and len(game.enemies) == 6
+
+# --- 宝石合并 ---
+def test_zero_merge_threshold_is_rejected(config):
+    config['game_settings']['gem_merge_threshold'] = 0
+    with pytest.raises(ConfigError, match='gem_merge_threshold'): compile_config(config)
+
+@pytest.mark.parametrize('threshold', [0, 1])
+def test_merge_gems_terminates_and_keeps_xp(config, threshold):
+    # 阈值 0 只能绕过配置校验直接设置，merge_gems 自己也要兜底
+    game = Game(headless=True, seed=5, config=config); fill_gems(game, 400); total = gem_xp(game)
+    game.gem_merge_threshold = threshold; game.merge_gems()
+    assert len(game.gem_store) == 1 and gem_xp(game) == total
+
+# --- 存档与回放 ---
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_snapshot_restore_continues_identically(config, tmp_path, vectorized):
+    config['game_settings']['vectorized_enemies'] = vectorized; path = str(tmp_path / 'state.gss')
+    original = Game(headless=True, seed=7, config=config); original.player.invincible = True; original.simulate(1500)
+    original.save_snapshot(path); original.simulate(600)
+    restored = Game(headless=True, seed=0, config=config); restored.load_snapshot(path); restored.simulate(600)
+    assert state(restored) == state(original)
+
+def wander(game):
+    # 确定性的自动驾驶：每 40 tick 换一个方向组合
+    return (MOVE_LEFT, MOVE_UP | MOVE_RIGHT, MOVE_DOWN, 0, MOVE_RIGHT)[game.sim_clock.ticks // 40 % 5]
+
+def test_input_log_replay_matches_recording(config, tmp_path):
+    # 升级时选最后一个选项：回放必须照录像里的选择走，而不是像 simulate 那样默认选第一个
+    path = str(tmp_path / 'run.gsrp')
+    recorded = Game(headless=True, seed=11, config=config); recorded.autopilot = wander; recorded.start_recording(path)
+    recorded.issue_command(CMD_INVINCIBLE); recorded.issue_command(CMD_GAIN_XP, 100)
+    for tick in range(2000):
+        if tick == 1000: recorded.issue_command(CMD_GAIN_XP, 300)
+        if recorded.level_up_state: recorded.issue_command(CMD_CHOICE, len(recorded.level_up_choices) - 1)
+        recorded.step()
+    recorded.stop_recording()
+    log = InputLog.load(path)
+    assert any(kind == CMD_CHOICE and arg > 0 for _, kind, arg in log.commands)
+    replayed = Game(headless=True, seed=log.seed, config=config); replayed.start_replay(log)
+    while replayed.running: replayed.step()
+    assert state(replayed) == state(recorded)
+
+# --- 免伤表 ---
+def test_hit_cooldowns_expire_after_duration():
+    cooldowns = HitCooldowns(tick_ms=10); source = SimpleNamespace(uid=1); target = SimpleNamespace(uid=2)
+    assert cooldowns.try_hit(source, target, 50)
+    cooldowns.advance(4); assert not cooldowns.try_hit(source, target, 50)
+    assert cooldowns.try_hit(SimpleNamespace(uid=3), target, 50)  # 不同来源各算各的
+    cooldowns.advance(5); assert len(cooldowns) == 1 and cooldowns.try_hit(source, target, 50)